@@ -9,8 +9,17 @@
 # file.
 
 from __future__ import print_function
+import os
 import sys
+import json
+import time
 import random
+import heapq
+import signal
+import logging
+import argparse
+import tempfile
+import threading
 #from numpy import append
 
 # Just some useful exceptions to raise during parsing
@@ -23,35 +32,60 @@ class AssignmentError(BaseException):
 class InvalidArgumentException(ValueError):
 	pass
 
-global_minima = 0
-
-class ProcessAssignment:
-	"""Stores an instance of the process assignment program."""
-	num_resources = 0
-	num_machines = 0
-	num_processes = 0
-	num_services = 0
-	num_locations = 0
-
-	# The capacities and the requirements will be presented as lists of
-	# tuples. Suppose there are three resources, and two machines. Then
-	# the contents of machine_capacities could be [(2, 11, 4), (9, 33, 1)].
-	machine_capacities = []
-	soft_machine_capacities = []
-	process_requirements = []
-
-	# The following are just lists of integers
-	machine_locations = []
-	service_min_spreads = []
-	process_services = []
-	process_moving_costs = []
-
-	# This is a list of machines, one for each process
-	assignment = None
-
-	def __init__(self, filename=None):
+# Raised when a running cost total disagrees with a full recomputation
+class CostError(BaseException):
+	pass
+
+# Names of the constraints, the rejection codes of move_rejections are
+# their index + 1 (0: the move is allowed)
+CONSTRAINTS = ["MCCon", "SCCon", "SSCon"]
+
+logger = logging.getLogger(__name__)
+
+def _expect_values(values, count):
+	"""Raises an InstanceError if the instance file holds less than count values."""
+	if len(values) < count:
+		raise InstanceError("Wrong number of values (expected %d, found %d)" % (count, len(values)))
+
+def _check_range(values, low, high, message):
+	"""Raises an InstanceError with message % value for the first value
+	outside [low, high]. The bounds are checked with min/max over the whole
+	list first, so valid files never get a per-value loop in Python."""
+	if values and (min(values) < low or max(values) > high):
+		for value in values:
+			if value < low or value > high:
+				raise InstanceError(message % value)
+
+# The problem data, shared by all assignments of an instance
+INSTANCE_FIELDS = ["num_resources", "num_machines", "num_processes", "num_services", "num_locations",
+	"machine_capacities", "soft_machine_capacities", "process_requirements",
+	"machine_locations", "service_min_spreads", "process_services", "process_moving_costs"]
+
+# Incremental state derived from the assignment, rebuilt by
+# _build_state() and kept up to date by move(). machine_loads holds the
+# summed requirements per machine and resource, machine_processes the
+# set of processes on each machine, service_machines a dict
+# machine -> number of processes per service, service_locations the
+# number of processes of each service per location and service_spreads
+# the number of distinct locations used by each service.
+STATE_FIELDS = ["machine_loads", "machine_processes", "service_machines", "service_locations", "service_spreads"]
+
+class Instance(object):
+	"""Stores an instance of the process assignment program. It is read
+	once and then only read: any number of ProcessAssignment objects (and
+	the original assignment) share one Instance.
+
+	The capacities and the requirements are tuples of per-row tuples.
+	Suppose there are three resources, and two machines. Then
+	machine_capacities could be ((2, 11, 4), (9, 33, 1)). The locations,
+	spreads, services and moving costs are tuples of integers."""
+	__slots__ = INSTANCE_FIELDS
+
+	def __init__(self, filename=None, **fields):
 		if filename:
-			self._read_instance_file(filename)
+			self._read_file(filename)
+		for name, value in fields.iteritems():
+			setattr(self, name, value)
 
 	def dump_instance(self, filename=None, mode='w'):
 		"""Writes the current instance in human-readable format to 
@@ -114,136 +148,138 @@ class ProcessAssignment:
 		if f is not sys.stdout:
 			f.close()
 
-	def _read_instance_file(self, filename):
+	def _read_file(self, filename):
 		"""Parses an instance file and overwrites any saved values 
                 with new data. Note that only very crude error checking is 
                 performed here (concerning the values and the formatting of 
                 the file). Most things will raise an exception, e.g. if the
 		values in the file are not integer, or are outside the 
-                allowed range."""
-		with open(filename) as instancefile:
-			# The first line contains the number of resources
-			self.num_resources = int(instancefile.readline().strip())
-			# The second line contains the number of machines
-			self.num_machines = int(instancefile.readline().strip())
-
-			if (self.num_resources < 1 or self.num_resources > 10):
-				raise InstanceError("The number of resources is not within limits")
-
-			if (self.num_machines < 1 or self.num_machines > 500):
-				raise InstanceError("The number of machines is not within limits")
-
-			# Initialize some lists (delete any previous data 
-                        # that may have been there)
-			self.machine_capacities = [0] * self.num_machines
-			self.soft_machine_capacities = [0] * self.num_machines
-			self.machine_locations = [0] * self.num_machines
-
-			# debug
-			print("LOG: read num_resources and num_machines")
-
-			# Next num_machines lines contain the following things:
-			# <location> <capacity for resource 
-                        # i=1...num_resources> <soft capacity for resource 
-                        # i=1...num_resources>
-			for machine in xrange(self.num_machines):
-				# Split the line at each space character to 
-                                # form a list of values
-				tokens = instancefile.readline().strip().split()
-
-				if len(tokens) != (1 + 2 * self.num_resources):
-					raise InstanceError("Wrong number of values (expected %d, found %d)" % (1 + 2 * self.num_resources, len(tokens)))
-
-				# First, read the machine location
-				location = int(tokens[0])
-
-				if (location < 0 or location > self.num_machines):
-					raise InstanceError("Invalid machine location: %d" % location)
-
-				# Here, we're just updating the number of 
-                                # locations as we observe more of them. 
-                                # The assumption is of course that all 
-                                # locations from 1 to n are in use, otherwise 
-                                #the number wouldn't technically be accurate.
-				if self.num_locations < location + 1:
-					self.num_locations = location + 1
-
-				self.machine_locations[machine] = location
-
-				# Then the (hard) capacities
-				self.machine_capacities[machine] = tuple([int(t) for t in tokens[1:self.num_resources+1]])
-				# ...and the soft capacities
-				self.soft_machine_capacities[machine] = tuple([int(t) for t in tokens[self.num_resources+1:]])
-
-				# debug
-			print("LOG: read machine locations and capacities")
-
-			# The next line has the number of services
-			self.num_services = int(instancefile.readline().strip())
-
-			if (self.num_services < 1 or self.num_services > 2000):
-				raise InstanceError("The number of services is not within limits")
-
-			self.service_min_spreads = [0] * self.num_services
-
-			# The next num_services lines contain the minimum 
-                        # spreads for each service
-			for service in xrange(self.num_services):
-				min_spread = int(instancefile.readline().strip())
-
-				if (min_spread < 0 or min_spread > self.num_locations):
-					raise InstanceError("Invalid service spread value: %d" % min_spread)
-				
-				self.service_min_spreads[service] = min_spread
-
-			# debug
-			print("LOG: read service spreads")
-
-			# The next line has the number of processes
-			self.num_processes = int(instancefile.readline().strip())
-
-			if (self.num_processes < 1 or self.num_processes > 2000):
-				raise InstanceError("The number of processes is not within limits")
-
-			self.process_services = [0] * self.num_processes
-			self.process_requirements = [0] * self.num_processes
-			self.process_moving_costs = [0] * self.num_processes
+                allowed range.
 
-			# The next num_processes lines contain the 
-                        # requirements for each process
-			for process in xrange(self.num_processes):
-				# Split the line at each space character to 
-                                # form a list of values
-				tokens = instancefile.readline().strip().split()
-
-				if len(tokens) != (2 + self.num_resources):
-					raise InstanceError("Wrong number of values (expected %d, found %d)" % (2 + self.num_resources, len(tokens)))
-
-				# First, read the service this process 
-                                # belongs to
-				service = int(tokens[0])
-
-				if (service < 0 or service > self.num_services):
-					raise InstanceError("Invalid service value for process: %d" % service)
-
-				self.process_services[process] = service
-
-				# Then, read the requirements this process 
-                                # has for each resource
-				self.process_requirements[process] = tuple([int(t) for t in tokens[1:self.num_resources+1]])
-
-				# The last value is the moving cost of the 
-                                # process
-				moving_cost = int(tokens[self.num_resources + 1])
-
-				if (moving_cost < 0 or moving_cost > 1000):
-					raise InstanceError("The moving cost is not within limits")
-
-				self.process_moving_costs[process] = moving_cost
+		The whole file is read and converted to one list of integers at
+		once, the machine, service and process blocks are then sliced out
+		of it by offset."""
+		with open(filename) as instancefile:
+			values = map(int, instancefile.read().split())
+
+		_expect_values(values, 2)
+		# The first value is the number of resources, the second one the
+		# number of machines
+		self.num_resources = values[0]
+		self.num_machines = values[1]
+
+		if (self.num_resources < 1 or self.num_resources > 10):
+			raise InstanceError("The number of resources is not within limits")
+
+		if (self.num_machines < 1 or self.num_machines > 500):
+			raise InstanceError("The number of machines is not within limits")
+
+		# Next num_machines rows contain the following things:
+		# <location> <capacity for resource i=1...num_resources>
+		# <soft capacity for resource i=1...num_resources>
+		width = 1 + 2 * self.num_resources
+		start = 2
+		end = start + self.num_machines * width
+		_expect_values(values, end + 1)
+		machines = values[start:end]
+
+		self.machine_locations = machines[0::width]
+		_check_range(self.machine_locations, 0, self.num_machines, "Invalid machine location: %d")
+		# The assumption is that all locations from 0 to n are in use,
+		# otherwise the number wouldn't technically be accurate.
+		self.num_locations = max(self.machine_locations) + 1
+
+		resources = self.num_resources
+		self.machine_capacities = [tuple(machines[row+1:row+1+resources]) for row in xrange(0, len(machines), width)]
+		self.soft_machine_capacities = [tuple(machines[row+1+resources:row+width]) for row in xrange(0, len(machines), width)]
+		logger.debug("read num_resources, num_machines, machine locations and capacities")
+
+		# The next value is the number of services, followed by the
+		# minimum spread of each service
+		self.num_services = values[end]
+
+		if (self.num_services < 1 or self.num_services > 2000):
+			raise InstanceError("The number of services is not within limits")
+
+		start = end + 1
+		end = start + self.num_services
+		_expect_values(values, end + 1)
+		self.service_min_spreads = values[start:end]
+		_check_range(self.service_min_spreads, 0, self.num_locations, "Invalid service spread value: %d")
+		logger.debug("read service spreads")
+
+		# The next value is the number of processes, followed by one row
+		# <service> <requirement for resource i=1...num_resources> <moving cost>
+		# for each process
+		self.num_processes = values[end]
+
+		if (self.num_processes < 1 or self.num_processes > 2000):
+			raise InstanceError("The number of processes is not within limits")
+
+		width = 2 + self.num_resources
+		start = end + 1
+		end = start + self.num_processes * width
+		_expect_values(values, end)
+		processes = values[start:end]
+
+		self.process_services = processes[0::width]
+		_check_range(self.process_services, 0, self.num_services, "Invalid service value for process: %d")
+
+		self.process_requirements = [tuple(processes[row+1:row+1+resources]) for row in xrange(0, len(processes), width)]
+
+		self.process_moving_costs = processes[width-1::width]
+		_check_range(self.process_moving_costs, 0, 1000, "The moving cost is not within limits")
+
+		if len(values) != end:
+			raise InstanceError("Wrong number of values (expected %d, found %d)" % (end, len(values)))
+
+		logger.debug("read processes")
+
+		# read-only from here on
+		self.machine_locations = tuple(self.machine_locations)
+		self.machine_capacities = tuple(self.machine_capacities)
+		self.soft_machine_capacities = tuple(self.soft_machine_capacities)
+		self.service_min_spreads = tuple(self.service_min_spreads)
+		self.process_services = tuple(self.process_services)
+		self.process_requirements = tuple(self.process_requirements)
+		self.process_moving_costs = tuple(self.process_moving_costs)
+		logger.debug("finished reading instance %s", filename)
+
+class ProcessAssignment(object):
+	"""An assignment of the processes of an Instance to machines plus the
+	incremental state derived from it. The instance data is reachable
+	both as self.instance and, for speed in the search loops, as
+	attributes of the same names (references to the shared objects, not
+	copies). clone() gives an independent assignment of the same instance."""
+	__slots__ = ["instance", "assignment"] + INSTANCE_FIELDS + STATE_FIELDS
+
+	# class used to read instance files, see vectorised.py
+	instance_class = Instance
+
+	def __init__(self, filename=None, instance=None):
+		if filename:
+			instance = self.instance_class(filename)
+		self.instance = instance
+		if instance is not None:
+			for name in INSTANCE_FIELDS:
+				setattr(self, name, getattr(instance, name))
+		# This is a list of machines, one for each process
+		self.assignment = None
+		for name in STATE_FIELDS:
+			setattr(self, name, None)
+
+	def clone(self):
+		"""A copy of this assignment sharing the instance: the assignment
+		vector is copied once and the incremental state rebuilt from it,
+		O(P*R) and nothing is read again."""
+		other = self.__class__(instance=self.instance)
+		other.assignment = list(self.assignment)
+		other._build_state()
+		return other
 
-			# debug
-			print("LOG: read processes")
-			print("LOG: finished reading instance")
+	def dump_instance(self, filename=None, mode='w'):
+		"""Writes the instance in human-readable format to a given file or stdout."""
+		self.instance.dump_instance(filename, mode)
 
 	def update_assignment(self, filename):
 		"""Reads an assignment from a file, overwrites a previous assignment if one existed."""
@@ -258,8 +294,220 @@ class ProcessAssignment:
 			# Parse the machine the process is assigned to
 			for process in xrange(self.num_processes):
 				self.assignment[process] = int(tokens[process])
-		# debug
-		print("LOG: finished reading assignment")
+
+		self._build_state()
+		logger.debug("finished reading assignment %s", filename)
+
+	def _build_state(self):
+		"""Rebuilds the incremental machine and service state from scratch
+		out of the current assignment."""
+		self.machine_loads = [[0] * self.num_resources for machine in xrange(self.num_machines)]
+		self.machine_processes = [set() for machine in xrange(self.num_machines)]
+		self.service_machines = [{} for service in xrange(self.num_services)]
+		self.service_locations = [[0] * self.num_locations for service in xrange(self.num_services)]
+		self.service_spreads = [0] * self.num_services
+
+		for process in xrange(self.num_processes):
+			self._add_process(process, self.assignment[process])
+
+	def _add_process(self, process, machine):
+		"""Accounts for process running on machine in the incremental state."""
+		load = self.machine_loads[machine]
+		requirements = self.process_requirements[process]
+		for resource in xrange(self.num_resources):
+			load[resource] += requirements[resource]
+		self.machine_processes[machine].add(process)
+
+		service = self.process_services[process]
+		machines = self.service_machines[service]
+		machines[machine] = machines.get(machine, 0) + 1
+		location_counts = self.service_locations[service]
+		location = self.machine_locations[machine]
+		if location_counts[location] == 0:
+			self.service_spreads[service] += 1
+		location_counts[location] += 1
+
+	def _remove_process(self, process, machine):
+		"""Removes process running on machine from the incremental state."""
+		load = self.machine_loads[machine]
+		requirements = self.process_requirements[process]
+		for resource in xrange(self.num_resources):
+			load[resource] -= requirements[resource]
+		self.machine_processes[machine].discard(process)
+
+		service = self.process_services[process]
+		machines = self.service_machines[service]
+		if machines[machine] == 1:
+			del machines[machine]
+		else:
+			machines[machine] -= 1
+		location_counts = self.service_locations[service]
+		location = self.machine_locations[machine]
+		location_counts[location] -= 1
+		if location_counts[location] == 0:
+			self.service_spreads[service] -= 1
+
+	def moving_cost(self, original_assignment):
+		"""Sum of the moving costs of all processes that left their original machine."""
+		move_cost = 0
+		for process in xrange(self.num_processes):
+			if self.assignment[process] != original_assignment.assignment[process]:
+				move_cost += self.process_moving_costs[process]
+		return move_cost
+
+	def machine_load_cost(self, machine):
+		"""Sum of the loads above the soft capacities of one machine."""
+		load = self.machine_loads[machine]
+		soft = self.soft_machine_capacities[machine]
+		return sum(max(load[resource] - soft[resource], 0) for resource in xrange(self.num_resources))
+
+	def load_cost(self):
+		"""Sum of the loads above the soft capacities over all machines and resources (MLCost)."""
+		load_cost = 0
+		for machine in xrange(self.num_machines):
+			machine_load = self.machine_loads[machine]
+			soft_capacity = self.soft_machine_capacities[machine]
+			for resource in xrange(self.num_resources):
+				if machine_load[resource] > soft_capacity[resource]:
+					load_cost += machine_load[resource] - soft_capacity[resource]
+		return load_cost
+
+	def capacity_overflow(self):
+		"""Sum of the loads above the hard capacities over all machines and
+		resources, zero iff MCCon holds for the whole assignment."""
+		overflow = 0
+		for machine in xrange(self.num_machines):
+			machine_load = self.machine_loads[machine]
+			capacity = self.machine_capacities[machine]
+			for resource in xrange(self.num_resources):
+				if machine_load[resource] > capacity[resource]:
+					overflow += machine_load[resource] - capacity[resource]
+		return overflow
+
+	def conflict_count(self):
+		"""Number of processes sharing a machine with a process of the same
+		service (per machine and service: processes - 1), zero iff SCCon holds."""
+		conflicts = 0
+		for service in xrange(self.num_services):
+			for count in self.service_machines[service].itervalues():
+				conflicts += count - 1
+		return conflicts
+
+	def spread_shortfall(self):
+		"""Locations missing from the minimum spreads summed over all
+		services, zero iff SSCon holds."""
+		shortfall = 0
+		for service in xrange(self.num_services):
+			shortfall += max(self.service_min_spreads[service] - self.service_spreads[service], 0)
+		return shortfall
+
+	def evaluate_moves(self, process, original_assignment=None):
+		"""Evaluates moving process to every machine: move_rejections plus
+		move_deltas. Returns (feasible, delta): feasible[machine] tells whether
+		MCCon, SCCon and SSCon allow the move (as try_constraints would),
+		delta[machine] is the exact change of the load cost, plus the change
+		of the moving cost when original_assignment is given. Staying put is
+		never feasible."""
+		feasible = [code == 0 for code in self.move_rejections(process)]
+		feasible[self.assignment[process]] = False
+		return feasible, self.move_deltas(process, original_assignment)
+
+	def _leave_delta(self, process):
+		"""Load cost change on the current machine when process leaves it,
+		the same for every target."""
+		current = self.assignment[process]
+		requirements = self.process_requirements[process]
+		current_load = self.machine_loads[current]
+		current_soft = self.soft_machine_capacities[current]
+		leave_delta = 0
+		for resource in xrange(self.num_resources):
+			leave_delta += max(current_load[resource] - requirements[resource] - current_soft[resource], 0) - max(current_load[resource] - current_soft[resource], 0)
+		return leave_delta
+
+	def _spread_without(self, process):
+		"""Processes per location and spread of the service of process once
+		the process has left its current location."""
+		service = self.process_services[process]
+		location = self.machine_locations[self.assignment[process]]
+		location_counts = list(self.service_locations[service])
+		location_counts[location] -= 1
+		spread = self.service_spreads[service]
+		if location_counts[location] == 0:
+			spread -= 1
+		return location_counts, spread
+
+	def _moving_cost_deltas(self, process, original_assignment):
+		"""Change of the moving cost per target machine (all 0 without an
+		original_assignment)."""
+		if original_assignment is None:
+			return [0] * self.num_machines
+		original_machine = original_assignment.assignment[process]
+		moving_cost = self.process_moving_costs[process]
+		paid = moving_cost if self.assignment[process] != original_machine else 0
+		move_delta = [moving_cost - paid] * self.num_machines
+		move_delta[original_machine] = -paid
+		return move_delta
+
+	def move_rejections(self, process):
+		"""The constraint half of evaluate_moves: rejections[machine] is 0 if
+		moving process to machine is allowed, else the index + 1 in
+		CONSTRAINTS of the first constraint it breaks (checked in the order
+		of try_constraints). The current machine is 0, staying is not a move."""
+		current = self.assignment[process]
+		service = self.process_services[process]
+		requirements = self.process_requirements[process]
+		resources = xrange(self.num_resources)
+		location_counts, spread = self._spread_without(process)
+		min_spread = self.service_min_spreads[service]
+		service_machines = self.service_machines[service]
+
+		rejections = [0] * self.num_machines
+		for machine in xrange(self.num_machines):
+			if machine == current:
+				continue
+			load = self.machine_loads[machine]
+			capacity = self.machine_capacities[machine]
+			for resource in resources:
+				if load[resource] + requirements[resource] > capacity[resource]:
+					rejections[machine] = 1
+					break
+			else:
+				if machine in service_machines:
+					rejections[machine] = 2
+				elif spread + (location_counts[self.machine_locations[machine]] == 0) < min_spread:
+					rejections[machine] = 3
+		return rejections
+
+	def move_deltas(self, process, original_assignment=None):
+		"""The cost half of evaluate_moves: the delta of every target machine
+		without looking at the constraints."""
+		current = self.assignment[process]
+		requirements = self.process_requirements[process]
+		resources = xrange(self.num_resources)
+		leave_delta = self._leave_delta(process)
+		move_delta = self._moving_cost_deltas(process, original_assignment)
+
+		delta = [0] * self.num_machines
+		for machine in xrange(self.num_machines):
+			if machine == current:
+				continue
+			load = self.machine_loads[machine]
+			soft = self.soft_machine_capacities[machine]
+			machine_delta = leave_delta + move_delta[machine]
+			for resource in resources:
+				machine_delta += max(load[resource] + requirements[resource] - soft[resource], 0) - max(load[resource] - soft[resource], 0)
+			delta[machine] = machine_delta
+		return delta
+
+	def move(self, process, machine):
+		"""Moves a process to a new machine and updates the incremental
+		state in O(R). Always use this instead of writing to assignment."""
+		current = self.assignment[process]
+		if current == machine:
+			return
+		self._remove_process(process, current)
+		self.assignment[process] = machine
+		self._add_process(process, machine)
 		
 #======================================================================
 # TODO 
@@ -275,214 +523,577 @@ def shared_processes(proc_assignment,target_element,target_list):
 	return shared_processes
 
 def verify_service_spread(proc_assignment, process, machine):
-	"""Verify if the minimum service spread is still OK when moving a process to a new machine"""
-	shared_proc_service = shared_processes(proc_assignment, proc_assignment.process_services[process], proc_assignment.process_services) # processes with the same service
-	if process in shared_proc_service:
-		shared_proc_service.remove(process) # don't want to include process being evaluated since it moves
-	location_list = [proc_assignment.machine_locations[machine]] # add the location of the instanced machine at the beginning because our process moves to it
-	for proc in xrange(shared_proc_service.__len__()):
-		if proc_assignment.machine_locations[proc_assignment.assignment[shared_proc_service[proc]]] not in location_list:# if we find a new location, add it to the list
-			location_list.append(proc_assignment.machine_locations[proc_assignment.assignment[shared_proc_service[proc]]])
-	return (location_list.__len__() >= proc_assignment.service_min_spreads[proc_assignment.process_services[process]])
+	"""Verify if the minimum service spread is still OK when moving a process to a new machine, in O(1)"""
+	service = proc_assignment.process_services[process]
+	spread = proc_assignment.service_spreads[service] # distinct locations of the service
+	old_location = proc_assignment.machine_locations[proc_assignment.assignment[process]]
+	new_location = proc_assignment.machine_locations[machine]
+	if old_location != new_location:
+		location_counts = proc_assignment.service_locations[service] # processes of the service per location
+		if location_counts[old_location] == 1: # the process was the last one in its old location...
+			spread -= 1
+		if location_counts[new_location] == 0: # ...and opens the new one
+			spread += 1
+	return spread >= proc_assignment.service_min_spreads[service]
 	
 def try_constraints(proc_assignment, process, machine):
 	"""Try constraints for allowing a process into a machine"""
 	# MCCon
-	mccon = True
 	machine_capacity = proc_assignment.machine_capacities[machine]
-	local_process_cost = [0] * machine_capacity.__len__() #sum of the processes in a machine
-	shared_proc_machine = shared_processes(proc_assignment, machine,proc_assignment.assignment)
-	#print("processes in machine ",machine)
-	#print("\t",shared_proc_machine)
-	if process not in shared_proc_machine:
-		shared_proc_machine.append(process) #include the process to be moved
-	#print("\t",shared_proc_machine)
-	for i in xrange(shared_proc_machine.__len__()):
-		#print("process ",shared_proc_machine[i])
-		for j in xrange(machine_capacity.__len__()):
-			local_process_cost[j] += proc_assignment.process_requirements[shared_proc_machine[i]][j] #process i, resource j
-			#print("\trequirement ",j,"\t",proc_assignment.process_requirements[i][j])
-			#print("\t\tlocal_process_cost ",local_process_cost)
-	for j in xrange(machine_capacity.__len__()):
-		#print("machine ",machine,"\n\tlocal process cost ",local_process_cost[j],"\n\tmachine_capacity ",machine_capacity[j])
-		#print("before the evaluation ",local_process_cost," ",machine_capacity)
-		#print("soft capacity constraints?? ", proc_assignment.soft_machine_capacities[machine])
-		if local_process_cost[j] > machine_capacity[j]:
-			#print("MCCon not met!!")
-			mccon = False
+	machine_load = proc_assignment.machine_loads[machine]
+	process_requirements = proc_assignment.process_requirements[process]
+	if proc_assignment.assignment[process] == machine:
+		process_requirements = [0] * proc_assignment.num_resources # already counted in the machine load
+	for resource in xrange(proc_assignment.num_resources):
+		if machine_load[resource] + process_requirements[resource] > machine_capacity[resource]:
 			#print ("MCCon unsatisfied for ", process," in machine ",machine)
 			return False
 	
 	# SCCon
-	sccon = True
-	shared_proc_machine = shared_processes(proc_assignment, machine,proc_assignment.assignment)
-	for i in xrange(shared_proc_machine.__len__()):
-		if proc_assignment.process_services[process] == proc_assignment.process_services[shared_proc_machine[i]]:
-			sccon = False
-			#print ("SCCon unsatisfied for ",process," in machine ",machine)
-			return False 
+	service = proc_assignment.process_services[process]
+	if machine in proc_assignment.service_machines[service]: # the process itself counts as well
+		#print ("SCCon unsatisfied for ",process," in machine ",machine)
+		return False
 	# SSCon	
-	sscon = True
-	if proc_assignment.service_min_spreads[proc_assignment.process_services[process]]>1 : # is it necessary?
-		sscon = verify_service_spread(proc_assignment, process, machine)
-		if sscon == False :
+	if proc_assignment.service_min_spreads[service]>1 : # is it necessary?
+		if not verify_service_spread(proc_assignment, process, machine):
 			#print ("SSCon unsatisfied for ",process," in machine ",machine)
 			return False
 	
-	return (mccon & sccon & sscon)	
+	return True
+
+def try_swap(proc_assignment, process, partner):
+	"""Try constraints for exchanging the machines of two processes, in O(R)
+	plus the spread checks"""
+	machine = proc_assignment.assignment[process]
+	partner_machine = proc_assignment.assignment[partner]
+	if machine == partner_machine:
+		return False
+	
+	# MCCon: each machine loses one process and gains the other
+	requirements = proc_assignment.process_requirements[process]
+	partner_requirements = proc_assignment.process_requirements[partner]
+	load = proc_assignment.machine_loads[machine]
+	partner_load = proc_assignment.machine_loads[partner_machine]
+	capacity = proc_assignment.machine_capacities[machine]
+	partner_capacity = proc_assignment.machine_capacities[partner_machine]
+	for resource in xrange(proc_assignment.num_resources):
+		change = partner_requirements[resource] - requirements[resource]
+		if load[resource] + change > capacity[resource] or partner_load[resource] - change > partner_capacity[resource]:
+			return False
+	
+	service = proc_assignment.process_services[process]
+	partner_service = proc_assignment.process_services[partner]
+	if service == partner_service: # nothing changes for the service
+		return True
+	
+	# SCCon: the leaving process never shares the other one's service
+	if partner_machine in proc_assignment.service_machines[service] or machine in proc_assignment.service_machines[partner_service]:
+		return False
+	
+	# SSCon: the two services are distinct, so each move can be checked on its own
+	if proc_assignment.service_min_spreads[service]>1 and not verify_service_spread(proc_assignment, process, partner_machine):
+		return False
+	if proc_assignment.service_min_spreads[partner_service]>1 and not verify_service_spread(proc_assignment, partner, machine):
+		return False
+	
+	return True
 
-def local_cost_delta(proc_assignment, process, machine):
-	"""Calculates the cost difference for moving a process to a new machine.
+def local_cost_delta(proc_assignment, process, machine, original_assignment=None):
+	"""Calculates the exact cost difference for moving a process to a new machine in O(R).
 	Positive -> bad, new configuration costs more
-	Negative -> good, new configuration costs less"""
+	Negative -> good, new configuration costs less
+	The moving cost is only counted with an original_assignment: it is paid when
+	the process leaves its original machine and refunded when it returns there.
+	Moving a process to the machine it is on changes nothing."""
+	old_machine = proc_assignment.assignment[process]
+	if old_machine == machine:
+		return 0
+
+	total_cost = 0
+	if original_assignment is not None:
+		original_machine = original_assignment.assignment[process]
+		if old_machine == original_machine:
+			total_cost += proc_assignment.process_moving_costs[process]
+		elif machine == original_machine:
+			total_cost -= proc_assignment.process_moving_costs[process]
 
-	moving_cost = proc_assignment.process_moving_costs[process]
-	total_cost = moving_cost
-	
-	machineload_cost_old = [0] * proc_assignment.machine_capacities[0].__len__()
-	machineload_cost_new = [0] * proc_assignment.machine_capacities[0].__len__()
 	process_cost = proc_assignment.process_requirements[process]
-	shared_proc_machine_old = shared_processes(proc_assignment, proc_assignment.assignment[process],proc_assignment.assignment) #processes in the old machine
-	shared_proc_machine_new = shared_processes(proc_assignment, machine, proc_assignment.assignment) #processes in the new machine
-	
-	#costs in new and old machine before moving process
-	for i in xrange(shared_proc_machine_old.__len__()):
-		for j in xrange(proc_assignment.machine_capacities[0].__len__()):
-			machineload_cost_old[j] += proc_assignment.process_requirements[shared_proc_machine_old[i]][j]
-	for i in xrange(shared_proc_machine_new.__len__()):
-		for j in xrange(proc_assignment.machine_capacities[0].__len__()):
-			machineload_cost_new[j] += proc_assignment.process_requirements[shared_proc_machine_new[i]][j]
-
-	#check if soft capacities lower limit is reached
-	for j in xrange(proc_assignment.machine_capacities[0].__len__()):
-		if (machineload_cost_old[j]-process_cost[j])>proc_assignment.soft_machine_capacities[proc_assignment.assignment[process]][j]: #assigment[process] = old machine
-			#don't remove too much cost, only until soft capacities limit
-			total_cost -= machineload_cost_old[j] - proc_assignment.soft_machine_capacities[proc_assignment.assignment[process]][j]
-		else:
-			#soft capacities not reached, remove whole cost
-			total_cost -= process_cost[j]
-	
-	#check if soft capacities upper limit is reached
-	for j in xrange(proc_assignment.machine_capacities[0].__len__()):
-		if machineload_cost_new[j] > proc_assignment.soft_machine_capacities[machine][j]:
-			total_cost += process_cost[j]
-		else:
-			total_cost += machineload_cost_new[j] + process_cost[j] - proc_assignment.soft_machine_capacities[machine][j]
+	machineload_cost_old = proc_assignment.machine_loads[old_machine] #load of the old machine
+	machineload_cost_new = proc_assignment.machine_loads[machine] #load of the new machine
+	soft_capacity_old = proc_assignment.soft_machine_capacities[old_machine]
+	soft_capacity_new = proc_assignment.soft_machine_capacities[machine]
+
+	for j in xrange(proc_assignment.num_resources):
+		#the old machine only saves what was above its soft capacity
+		total_cost += max(machineload_cost_old[j] - process_cost[j] - soft_capacity_old[j], 0) - max(machineload_cost_old[j] - soft_capacity_old[j], 0)
+		#the new machine only pays what ends up above its soft capacity
+		total_cost += max(machineload_cost_new[j] + process_cost[j] - soft_capacity_new[j], 0) - max(machineload_cost_new[j] - soft_capacity_new[j], 0)
 	
 	return total_cost
 	
+def moving_cost(proc_assignment, original_assignment):
+	"""Sum of the moving costs of all processes that left their original machine."""
+	return proc_assignment.moving_cost(original_assignment)
+
+def load_cost(proc_assignment):
+	"""Sum of the loads above the soft capacities over all machines and resources (MLCost)."""
+	return proc_assignment.load_cost()
+
 def global_cost(proc_assignment, original_assignment):
-	
-	move_cost = 0
-	
-	for process in xrange(proc_assignment.num_processes):
-		if proc_assignment.assignment[process] != original_assignment.assignment[process]:
-			move_cost += proc_assignment.process_moving_costs[process]
-	
-	load_cost = 0
-	
-	for machine in xrange(proc_assignment.num_machines):
-		shared_machine_proc = shared_processes(proc_assignment, machine, proc_assignment.assignment)
-		machine_load_cost = [0] * proc_assignment.num_resources
-		for process in xrange(shared_machine_proc.__len__()):
-			for resource in xrange(proc_assignment.num_resources):
-				machine_load_cost[resource] += proc_assignment.process_requirements[shared_machine_proc[process]][resource]
-		for resource in xrange(proc_assignment.num_resources):
-			if machine_load_cost[resource] > proc_assignment.soft_machine_capacities[machine][resource]:
-				load_cost += machine_load_cost[resource] - proc_assignment.soft_machine_capacities[machine][resource]
-	
-	return move_cost + load_cost
-
-def randomize(proc_assignment, iterations, cost_reduction):
-	"""Look iterations times for a random couple of process -> machine with constraints satisfiable.
-		if it is possible, move the instance to that neighbor."""
-	changes = 0
-	while changes < iterations:
-		rand_process = random.randint(0,proc_assignment.num_processes-1)
-		rand_machine = random.randint(0,proc_assignment.num_machines-1)
-		if try_constraints(proc_assignment, rand_process, rand_machine):
-			proc_assignment.assignment[rand_process] = rand_machine
-			cost_reduction += local_cost_delta(proc_assignment, rand_process, rand_machine)
-			changes += 1
-	#print("we are dealing now with\n",proc_assignment.assignment)
-	dump_real_assignment(proc_assignment.assignment, filename = "dms_assignment1_small/test_file")
-	return cost_reduction	
-		
-					
-	
-def probe_neighbor(proc_assignment, original_assignment):
-	"""see what is the least moving cost, then swap processes machines if possible: steepest descent"""
-	global global_minima
+	"""Total cost of the assignment: load cost plus moving cost w.r.t. the original assignment."""
+	return moving_cost(proc_assignment, original_assignment) + load_cost(proc_assignment)
+
+class CostTracker(object):
+	"""Keeps the load cost and the moving cost of an assignment as running
+	totals that are updated from the delta of every move. With a non-zero
+	check_interval the totals are cross-checked against global_cost every
+	check_interval moves (debugging only, this is O(M*R + P))."""
+
+	def __init__(self, proc_assignment, original_assignment, check_interval=0):
+		self.proc_assignment = proc_assignment
+		self.original_assignment = original_assignment
+		self.check_interval = check_interval
+		self.moves = 0
+		self.reset()
+
+	def reset(self):
+		"""Recomputes both totals from scratch, e.g. after the assignment was changed behind our back."""
+		self.load_cost = load_cost(self.proc_assignment)
+		self.move_cost = moving_cost(self.proc_assignment, self.original_assignment)
+
+	@property
+	def total(self):
+		return self.load_cost + self.move_cost
+
+	def load_delta(self, process, machine):
+		"""Exact change of the load cost if process moves to machine, in O(R)."""
+		return local_cost_delta(self.proc_assignment, process, machine)
+
+	def move_delta(self, process, machine):
+		"""Exact change of the moving cost if process moves to machine, in O(1)."""
+		pa = self.proc_assignment
+		original_machine = self.original_assignment.assignment[process]
+		was_moved = pa.assignment[process] != original_machine
+		is_moved = machine != original_machine
+		if was_moved == is_moved:
+			return 0
+		if is_moved:
+			return pa.process_moving_costs[process]
+		return -pa.process_moving_costs[process]
+
+	def delta(self, process, machine):
+		"""Exact change of the total cost if process moves to machine."""
+		return self.load_delta(process, machine) + self.move_delta(process, machine)
+
+	def swap_delta(self, process, partner):
+		"""Exact change of the total cost if process and partner exchange machines, in O(R)."""
+		pa = self.proc_assignment
+		machine = pa.assignment[process]
+		partner_machine = pa.assignment[partner]
+		if machine == partner_machine:
+			return 0
+		requirements = pa.process_requirements[process]
+		partner_requirements = pa.process_requirements[partner]
+		load = pa.machine_loads[machine]
+		partner_load = pa.machine_loads[partner_machine]
+		soft = pa.soft_machine_capacities[machine]
+		partner_soft = pa.soft_machine_capacities[partner_machine]
+		delta = self.move_delta(process, partner_machine) + self.move_delta(partner, machine)
+		for resource in xrange(pa.num_resources):
+			change = partner_requirements[resource] - requirements[resource]
+			delta += max(load[resource] + change - soft[resource], 0) - max(load[resource] - soft[resource], 0)
+			delta += max(partner_load[resource] - change - partner_soft[resource], 0) - max(partner_load[resource] - partner_soft[resource], 0)
+		return delta
+
+	def swap(self, process, partner):
+		"""Exchanges the machines of process and partner and updates the running totals."""
+		pa = self.proc_assignment
+		machine = pa.assignment[process]
+		partner_machine = pa.assignment[partner]
+		move_delta = self.move_delta(process, partner_machine) + self.move_delta(partner, machine)
+		self.load_cost += self.swap_delta(process, partner) - move_delta
+		self.move_cost += move_delta
+		pa.move(process, partner_machine)
+		pa.move(partner, machine)
+		self.moves += 1
+		if self.check_interval and self.moves % self.check_interval == 0:
+			self.check()
+
+	def move(self, process, machine):
+		"""Moves process to machine and updates the running totals."""
+		self.load_cost += self.load_delta(process, machine)
+		self.move_cost += self.move_delta(process, machine)
+		self.proc_assignment.move(process, machine)
+		self.moves += 1
+		if self.check_interval and self.moves % self.check_interval == 0:
+			self.check()
+
+	def check(self):
+		"""Compares the running totals with a full recomputation."""
+		expected = global_cost(self.proc_assignment, self.original_assignment)
+		if expected != self.total:
+			raise CostError("Running cost %d differs from global_cost %d after %d moves" % (self.total, expected, self.moves))
+
+class ProcessQueue(object):
+	"""Order in which probe_neighbor visits the processes during a sweep: a
+	lazy max-heap on the gain potential of each process (the load above the
+	soft capacities its machine would shed if the process left), ties going
+	to the lower moving cost. Popping costs O(log P). When the load of a
+	machine changes, touch() pushes fresh entries for the processes on it;
+	outdated entries are skipped when they come up."""
+
+	def __init__(self, proc_assignment):
+		self.proc_assignment = proc_assignment
+		self.reset()
+
+	def potential(self, process):
+		"""Load cost the machine of process would save without it."""
+		pa = self.proc_assignment
+		machine = pa.assignment[process]
+		load = pa.machine_loads[machine]
+		soft = pa.soft_machine_capacities[machine]
+		requirements = pa.process_requirements[process]
+		potential = 0
+		for resource in xrange(pa.num_resources):
+			overload = load[resource] - soft[resource]
+			if overload > 0:
+				potential += min(overload, requirements[resource])
+		return potential
+
+	def _entry(self, process):
+		return (-self.potential(process), self.proc_assignment.process_moving_costs[process], process, self.version[process])
+
+	def reset(self):
+		"""Starts a new sweep: every process is to be visited again."""
+		num_processes = self.proc_assignment.num_processes
+		self.version = [0] * num_processes
+		self.visited = [False] * num_processes
+		self.heap = [self._entry(process) for process in xrange(num_processes)]
+		heapq.heapify(self.heap)
+
+	def touch(self, machine):
+		"""Refreshes the priorities of the unvisited processes on machine."""
+		for process in self.proc_assignment.machine_processes[machine]:
+			if not self.visited[process]:
+				self.version[process] += 1
+				heapq.heappush(self.heap, self._entry(process))
+
+	def pop(self):
+		"""The unvisited process with the highest priority, None at the end of the sweep."""
+		while self.heap:
+			potential, moving_cost, process, version = heapq.heappop(self.heap)
+			if not self.visited[process] and version == self.version[process]:
+				self.visited[process] = True
+				return process
+		return None
+
+def swap_candidates(proc_assignment, process, deltas, num_machines=5):
+	"""Candidate swap partners for process: the processes on the num_machines
+	machines that would be the cheapest relocation targets according to
+	deltas (as returned by evaluate_moves), regardless of feasibility."""
+	current = proc_assignment.assignment[process]
+	machines = [machine for machine in xrange(proc_assignment.num_machines) if machine != current]
+	candidates = []
+	for machine in heapq.nsmallest(num_machines, machines, key=deltas.__getitem__):
+		candidates.extend(proc_assignment.machine_processes[machine])
+	return candidates
+
+def best_swap(cost_tracker, process, candidates):
+	"""Returns the feasible partner among candidates with the lowest swap
+	delta and that delta, or (None, 0) if no swap improves the cost."""
+	best_partner = None
+	best_delta = 0
+	for partner in candidates:
+		if try_swap(cost_tracker.proc_assignment, process, partner):
+			delta = cost_tracker.swap_delta(process, partner)
+			if delta < best_delta:
+				best_partner = partner
+				best_delta = delta
+	return best_partner, best_delta
+
+class SearchBudget(object):
+	"""Stopping criteria of a search: wall clock seconds, iterations (one
+	process step each) and sweeps in a row without a new minimum. None
+	means unlimited. stop() ends the search at the next check, e.g. from a
+	report callback once the cost reaches a lower bound."""
+
+	def __init__(self, time_limit=None, max_iterations=None, stall_sweeps=None):
+		self.time_limit = time_limit
+		self.max_iterations = max_iterations
+		self.stall_sweeps = stall_sweeps
+		self.start = time.time()
+		self.iterations = 0
+		self.stalled = 0
+		self.stopped = False
+
+	def elapsed(self):
+		return time.time() - self.start
+
+	def end_sweep(self, improved):
+		"""Counts the sweeps without improvement."""
+		if improved:
+			self.stalled = 0
+		else:
+			self.stalled += 1
+
+	def stop(self):
+		self.stopped = True
+
+	def exhausted(self):
+		if self.stopped:
+			return True
+		if self.max_iterations is not None and self.iterations >= self.max_iterations:
+			return True
+		if self.stall_sweeps is not None and self.stalled >= self.stall_sweeps:
+			return True
+		return self.time_limit is not None and self.elapsed() >= self.time_limit
+
+class BestAssignment(object):
+	"""Best assignment a search has seen and its cost, starting from the
+	current assignment of proc_assignment. Used as a context manager around
+	the search loop it swallows KeyboardInterrupt (and so SIGTERM, see
+	_terminate), so stopping by hand still hands back the best assignment.
+	Only the outermost search does: one running inside another (the polish
+	of the memetic search) passes the interrupt on, so the outer one stops
+	too instead of carrying on with what the inner one returned."""
+
+	# BestAssignment contexts entered and not yet left
+	active = 0
+
+	def __init__(self, proc_assignment, cost, report=None):
+		self.proc_assignment = proc_assignment
+		# (cost, assignment), replaced as a whole: a single attribute store,
+		# so an interrupt (SIGTERM included) can never separate the two
+		self.best = (cost, list(proc_assignment.assignment))
+		self.report = report
+
+	@property
+	def cost(self):
+		return self.best[0]
+
+	@property
+	def assignment(self):
+		return self.best[1]
+
+	def update(self, cost, assignment=None):
+		"""Takes cost with assignment (the current one of proc_assignment if
+		None) if it beats the best and calls report(cost, proc_assignment),
+		after loading a given assignment into proc_assignment. Returns
+		whether it was a new best."""
+		if cost >= self.best[0]:
+			return False
+		self.best = (cost, list(self.proc_assignment.assignment if assignment is None else assignment))
+		if self.report:
+			if assignment is not None:
+				self.proc_assignment.assignment = list(assignment)
+				self.proc_assignment._build_state()
+			self.report(cost, self.proc_assignment)
+		return True
+
+	def __enter__(self):
+		BestAssignment.active += 1
+		return self
+
+	def __exit__(self, kind, value, traceback):
+		BestAssignment.active -= 1
+		return kind is not None and issubclass(kind, KeyboardInterrupt) and BestAssignment.active == 0
+
+class Perturbation(object):
+	"""Kicks that move probe_neighbor out of a local minimum with a number of
+	random feasible moves. Targets are drawn from a list of feasible machines
+	per process instead of from uniformly random (process, machine) pairs,
+	so a kick cannot spin on rejected pairs. The lists are built at most
+	once per kick and process (with move_rejections), every drawn entry is
+	rechecked with try_constraints and dropped once it is no longer
+	feasible, which bounds the work of a kick by O(P*M*R). They are only
+	pruned, not kept up to date: a machine that becomes feasible for a
+	process during a kick (because others left it) is not drawn for that
+	process until the next kick, and the list of a process that moved is
+	built again. Strategies:
+	"random_walk" moves random processes, "segment" shuffles the processes
+	of a few consecutive machines among those machines and "overload"
+	moves processes off the machines with the highest load cost."""
+
+	STRATEGIES = ["random_walk", "segment", "overload"]
+
+	def __init__(self, cost_tracker, rng=random, segment_length=4):
+		self.cost_tracker = cost_tracker
+		self.proc_assignment = cost_tracker.proc_assignment
+		self.rng = rng
+		self.segment_length = segment_length
+		self.targets = [None] * self.proc_assignment.num_processes
+
+	def _targets(self, process):
+		"""Feasible targets of process, built on first use in the current kick."""
+		if self.targets[process] is None:
+			current = self.proc_assignment.assignment[process]
+			rejections = self.proc_assignment.move_rejections(process)
+			self.targets[process] = [machine for machine, code in enumerate(rejections) if code == 0 and machine != current]
+		return self.targets[process]
+
+	def _move_somewhere(self, process):
+		"""Moves process to a random feasible machine, False if it has none."""
+		targets = self._targets(process)
+		while targets:
+			index = self.rng.randrange(len(targets))
+			machine = targets[index]
+			if try_constraints(self.proc_assignment, process, machine):
+				self.cost_tracker.move(process, machine)
+				self.targets[process] = None # its targets changed with its machine
+				return True
+			targets[index] = targets[-1] # no longer feasible: drop it
+			targets.pop()
+		return False
+
+	def kick(self, moves, strategy="random_walk"):
+		"""Makes up to moves random feasible moves and returns how many were
+		made. At most 4 * moves processes are tried, so it always returns."""
+		self.targets = [None] * self.proc_assignment.num_processes
+		if strategy == "segment":
+			return self._segment(moves)
+		if strategy == "overload":
+			processes = self._overloaded_processes()
+		elif strategy == "random_walk":
+			processes = None
+		else:
+			raise InvalidArgumentException("Unknown kick strategy: %s" % strategy)
+
+		done = 0
+		for attempt in xrange(4 * moves):
+			if done >= moves:
+				break
+			if processes:
+				process = self.rng.choice(processes)
+			else:
+				process = self.rng.randrange(self.proc_assignment.num_processes)
+			if self._move_somewhere(process):
+				done += 1
+		return done
+
+	def _overloaded_processes(self):
+		"""Processes on the tenth of the machines with the highest load cost."""
+		pa = self.proc_assignment
+		machines = heapq.nlargest(max(pa.num_machines // 10, 1), xrange(pa.num_machines), key=pa.machine_load_cost)
+		processes = []
+		for machine in machines:
+			processes.extend(pa.machine_processes[machine])
+		return processes
+
+	def _segment(self, moves):
+		"""Moves the processes of random segments of consecutive machines to
+		random feasible machines of the same segment."""
+		pa = self.proc_assignment
+		length = min(self.segment_length, pa.num_machines)
+		done = 0
+		for attempt in xrange(4 * moves):
+			if done >= moves:
+				break
+			start = self.rng.randrange(pa.num_machines - length + 1)
+			segment = range(start, start + length)
+			processes = []
+			for machine in segment:
+				processes.extend(pa.machine_processes[machine])
+			self.rng.shuffle(processes)
+			for process in processes:
+				if done >= moves:
+					break
+				targets = [machine for machine in segment if try_constraints(pa, process, machine)]
+				if targets:
+					self.cost_tracker.move(process, self.rng.choice(targets))
+					done += 1
+		return done
+
+def probe_neighbor(proc_assignment, original_assignment, check_interval=0, swap_machines=5, report=None, rng=random, budget=None, kick="random_walk", kick_moves=None, metrics=None):
+	"""see what is the least moving cost, then swap processes machines if possible: steepest descent.
+	When no relocation improves, the process is swapped with a process on one of the
+	swap_machines most promising machines (0 disables swaps). Every sweep ends with a
+	Perturbation kick of kick_moves moves (2 * num_processes by default) by the kick strategy.
+	report(cost, proc_assignment) is called for every new minimum, rng is the source of
+	randomness (a random.Random gives independent searches their own state).
+	The search runs until the SearchBudget is exhausted (forever without one) or it is
+	interrupted, and returns (best cost, best assignment, number of moves evaluated);
+	the other searches return the same.
+	metrics is an optional metrics.Metrics that gets the counters and timings of the search.
+	check_interval > 0 cross-checks the running cost against global_cost every check_interval moves."""
+	if budget is None:
+		budget = SearchBudget()
+	if metrics is None:
+		from metrics import NullMetrics
+		metrics = NullMetrics()
 	#process with least moving cost specified? if not, find one
-	cost_reduction = 0
-	global_minima = global_cost(original_assignment, original_assignment) #calculate the original cost
-	while True:
-		blacklist = [0] * proc_assignment.num_processes
-		recursions = 0
-		costs = 0
-	
-		while (recursions<proc_assignment.num_processes-1):# & (costs != []):
+	cost_tracker = CostTracker(proc_assignment, original_assignment, check_interval)
+	best = BestAssignment(proc_assignment, cost_tracker.total, report) #starts at the original cost
+	evaluations = 0
+	with best:
+		process_queue = ProcessQueue(proc_assignment)
+		perturbation = Perturbation(cost_tracker, rng)
+		if kick_moves is None:
+			kick_moves = 2*proc_assignment.num_processes
+		while not budget.exhausted():
+			process_queue.reset()
+			recursions = 0
+			improved = False
 		
-			candidate_machines = []
-			costs = []
-			#print("run ",recursions)
-			
-			#look for the least moving cost process excluding the already moved processes
-			if blacklist == [0] * proc_assignment.num_processes:
-				min_move_cost_proc = proc_assignment.process_moving_costs.index(min(proc_assignment.process_moving_costs))
-				blacklist[min_move_cost_proc] = 1
-			else:
-				minimal = 1234
-				for process in xrange(proc_assignment.process_moving_costs.__len__()):
-					if (proc_assignment.process_moving_costs[process] <= minimal) & (blacklist[process]==0):
-						minimal = proc_assignment.process_moving_costs[process]
-						min_move_cost_proc = process
-				blacklist[min_move_cost_proc] = 1
+			while (recursions<proc_assignment.num_processes-1) and not budget.exhausted():
 			
-			#try constraints/cost for all machines where min_move_cost_proc can go
-			#print("currently evaluating ",proc_assignment.assignment)
-			for machine in xrange(proc_assignment.num_machines):
-				if try_constraints(proc_assignment, min_move_cost_proc, machine):
-					if local_cost_delta(proc_assignment, min_move_cost_proc, machine)<0:
+				candidate_machines = []
+				costs = []
+				
+				#most promising process not visited in this sweep: the ones on overloaded machines first, then the cheap to move ones
+				min_move_cost_proc = process_queue.pop()
+				if min_move_cost_proc is None:
+					break
+				old_machine = proc_assignment.assignment[min_move_cost_proc]
+				
+				#try constraints/cost for all machines where min_move_cost_proc can go, timed apart
+				rejections = metrics.timed("constraints", proc_assignment.move_rejections, min_move_cost_proc)
+				deltas = metrics.timed("cost", proc_assignment.move_deltas, min_move_cost_proc, original_assignment)
+				metrics.reject(rejections)
+				# staying put is not a move
+				metrics.evaluated += proc_assignment.num_machines - 1
+				evaluations += proc_assignment.num_machines - 1
+				for machine in xrange(proc_assignment.num_machines):
+					if rejections[machine] == 0 and deltas[machine]<0 and machine != old_machine:
 						candidate_machines.append(machine)
-						costs.append(local_cost_delta(proc_assignment, min_move_cost_proc,machine))
-			#print("we found ",candidate_machines.__len__()," candidates! process ",min_move_cost_proc," can go to machines ",candidate_machines)
-			#print("the costs are ",costs)
-	
+						costs.append(deltas[machine])
 				
-			# candidate_machines --> [1, 3, 5, 9] the ones that passed the constraints
-			# costs --> [-25, -58, -220, -98] keep only the negatives -> usefull solutions
-			
-			#info required to dump
-			if len(sys.argv) == 3:
-				# Print to stdout
-				outfile = None
-			else:
-				outfile = sys.argv[3]
-			
-			
-			if costs.__len__()>0:
-				best_machine = candidate_machines[costs.index(min(costs))]
-				#print(min_move_cost_proc," will move to ",best_machine)
-				proc_assignment.assignment[min_move_cost_proc] = best_machine
-				cost_reduction += min(costs) #update the local cost delta
-			
-			
-			#if there's a better neighbor, move to it, otherwise we found a local minima
-			if global_cost(proc_assignment, original_assignment) < global_minima:
-				global_minima = global_cost(proc_assignment, original_assignment)
-				print("New minima ",global_minima)
-				dump_real_assignment(proc_assignment.assignment, filename = outfile)
+				# candidate_machines --> [1, 3, 5, 9] the ones that passed the constraints
+				# costs --> [-25, -58, -220, -98] keep only the negatives -> usefull solutions
+				
+				if costs.__len__()>0:
+					best_machine = candidate_machines[costs.index(min(costs))]
+					metrics.timed("moves", cost_tracker.move, min_move_cost_proc, best_machine) #updates the running cost
+					metrics.accepted += 1
+					process_queue.touch(old_machine)
+					process_queue.touch(best_machine)
+				elif swap_machines:
+					#no relocation helps, most likely because the good machines are full
+					candidates = metrics.timed("swaps", swap_candidates, proc_assignment, min_move_cost_proc, deltas, swap_machines)
+					partner, delta = metrics.timed("swaps", best_swap, cost_tracker, min_move_cost_proc, candidates)
+					metrics.evaluated += candidates.__len__()
+					evaluations += candidates.__len__()
+					if partner is not None:
+						metrics.timed("moves", cost_tracker.swap, min_move_cost_proc, partner)
+						metrics.accepted += 1
+						process_queue.touch(old_machine)
+						process_queue.touch(proc_assignment.assignment[min_move_cost_proc])
+				
+				#if there's a better neighbor, move to it, otherwise we found a local minima
+				if best.update(cost_tracker.total):
+					improved = True
+					metrics.improved(best.cost)
+				
+				recursions += 1
+				budget.iterations += 1
+				metrics.tick()
 			
-			recursions += 1
-		
-	
-	
-		cost_reduction = randomize(proc_assignment, 2*proc_assignment.num_processes, cost_reduction)
-
-
-
+			budget.end_sweep(improved)
+			if not budget.exhausted():
+				metrics.kick_moves += metrics.timed("kicks", perturbation.kick, kick_moves, kick)
+	metrics.emit()
 
+	return best.cost, best.assignment, evaluations
 
 #=======================================================================
 
@@ -500,6 +1111,131 @@ def dump_real_assignment(assignment, filename=None, mode='w'):
 	if f is not sys.stdout:
 		f.close()
 		
+def read_instance(instance_file, cache_dir=None):
+	"""ProcessAssignment (without an assignment yet) of instance_file. With
+	a cache_dir the instance is memory-mapped from its binary cache there
+	instead of parsed, see vectorised.load_instance (needs NumPy)."""
+	if cache_dir:
+		from vectorised import load_instance
+		return load_instance(instance_file, cache_dir)
+	return ProcessAssignment(filename=instance_file)
+
+def _umask():
+	"""The process umask. Linux shows it in /proc/self/status; elsewhere
+	os.umask can only read it by setting it, which briefly leaves it at 0
+	for the other threads, so that is the fallback."""
+	try:
+		with open("/proc/self/status") as f:
+			for line in f:
+				if line.startswith("Umask:"):
+					return int(line.split()[1], 8)
+	except (EnvironmentError, ValueError, IndexError):
+		pass
+	umask = os.umask(0)
+	os.umask(umask)
+	return umask
+
+def new_file_mode(filename):
+	"""Permissions for a file about to replace filename: those of the
+	existing file, else what open() would give a new file under the umask.
+	mkstemp creates its files owner-only, so renamed temporary files need
+	an os.fchmod to this first."""
+	try:
+		return os.stat(filename).st_mode & 0o777
+	except OSError:
+		return 0o666 & ~_umask()
+
+def atomic_write(filename, write, prefix=".tmp"):
+	"""Calls write(f) on a temporary file (opened 'wb') next to filename,
+	syncs it to the disk and renames it over filename, so readers see
+	either the old file or all of the new one. The new file gets
+	new_file_mode(filename); the temporary file is removed on errors."""
+	directory = os.path.dirname(os.path.abspath(filename))
+	fd, tmpname = tempfile.mkstemp(dir=directory, prefix=prefix)
+	try:
+		os.fchmod(fd, new_file_mode(filename))
+		with os.fdopen(fd, 'wb') as f:
+			write(f)
+			f.flush()
+			os.fsync(f.fileno())
+		os.rename(tmpname, filename)
+	except BaseException:
+		if os.path.exists(tmpname):
+			os.remove(tmpname)
+		raise
+
+def save_assignment(assignment, filename):
+	"""Writes an assignment in one piece with atomic_write, so readers never
+	see a partial line."""
+	line = " ".join(str(machine) for machine in assignment) + " "
+	atomic_write(filename, lambda f: f.write(line), ".assignment")
+
+class CheckpointWriter(object):
+	"""Writes the best assignment found so far to filename on a background
+	thread. submit() only copies the assignment and hands it over, so the
+	search never waits for the disk; if new minima arrive faster than they
+	can be written only the latest one is written (with save_assignment,
+	so readers never see a partial file). close() writes what is pending
+	and stops the thread."""
+
+	def __init__(self, filename):
+		self.filename = filename
+		self.condition = threading.Condition()
+		self.pending = None
+		self.closed = False
+		self.written = 0
+		self.thread = threading.Thread(target=self._run, name="checkpoint")
+		self.thread.daemon = True
+		self.thread.start()
+
+	def submit(self, assignment):
+		"""Queues a copy of assignment, replacing an older one not written yet."""
+		assignment = list(assignment)
+		with self.condition:
+			self.pending = assignment
+			self.condition.notify()
+
+	def _run(self):
+		while True:
+			with self.condition:
+				while self.pending is None and not self.closed:
+					self.condition.wait()
+				if self.pending is None:
+					return
+				assignment, self.pending = self.pending, None
+			try:
+				save_assignment(assignment, self.filename)
+				self.written += 1
+			except EnvironmentError, e:
+				logger.warning("could not write checkpoint %s: %s", self.filename, e)
+
+	def close(self):
+		with self.condition:
+			self.closed = True
+			self.condition.notify()
+		self.thread.join()
+
+def load_checkpoint(proc_assignment, filename):
+	"""Replaces the assignment of proc_assignment with the one saved in
+	filename to resume a search. Returns False and leaves proc_assignment
+	untouched if the file is missing, unreadable or not a feasible
+	assignment of the instance."""
+	previous = proc_assignment.assignment
+	try:
+		proc_assignment.update_assignment(filename)
+		if proc_assignment.capacity_overflow() == 0 and proc_assignment.conflict_count() == 0 and proc_assignment.spread_shortfall() == 0:
+			return True
+		logger.warning("checkpoint %s is not feasible", filename)
+	except (EnvironmentError, ValueError, IndexError, AssignmentError), e:
+		logger.warning("could not load checkpoint %s: %s", filename, e)
+	proc_assignment.assignment = previous
+	proc_assignment._build_state()
+	return False
+
+def _terminate(signum, frame):
+	"""SIGTERM handler: stop the search like Ctrl-C does."""
+	raise KeyboardInterrupt
+
 def dump_assignment(assignment, filename=None, mode='w'):
 	"""Writes an assignment in human-readable format to a given file or 
         stdout."""
@@ -522,38 +1258,120 @@ def dump_assignment(assignment, filename=None, mode='w'):
 
 
 if __name__ == "__main__":
-	if len(sys.argv) not in [3, 4]:
-		print("Usage: python processassignment.py <instance_file> <initial_solution_file> [<output_file>]")
+	parser = argparse.ArgumentParser(description="Local search for the process assignment problem.")
+	parser.add_argument("instance_file")
+	parser.add_argument("initial_solution_file", help="moving costs are counted against this assignment, - for none (starts from a greedy one)")
+	parser.add_argument("output_file", nargs="?", help="best assignment is written here (stdout if omitted)")
+	parser.add_argument("--time-limit", type=float, help="stop after this many seconds")
+	parser.add_argument("--max-iterations", type=int, help="stop after this many process steps")
+	parser.add_argument("--stall-sweeps", type=int, help="stop after this many sweeps without a new minimum")
+	parser.add_argument("--strategy", choices=["descent", "anneal", "tabu", "lns", "penalty", "memetic"], default="descent", help="steepest descent with random kicks, simulated annealing, tabu search, large neighbourhood search, annealing through infeasible assignments with penalties or a memetic population search")
+	parser.add_argument("--schedule", choices=["geometric", "adaptive", "reheating"], default="geometric", help="cooling schedule of the annealing")
+	parser.add_argument("--tenure", type=int, default=20, help="tabu tenure in iterations")
+	parser.add_argument("--kick", choices=Perturbation.STRATEGIES, default="random_walk", help="perturbation between the descent sweeps")
+	parser.add_argument("--population", type=int, default=10, help="population size of the memetic search")
+	parser.add_argument("--workers", type=int, help="worker processes of the memetic search (default: one per core, 0: none)")
+	parser.add_argument("--cache-dir", help="memory-map a binary copy of the instance kept in this directory instead of parsing the text file (needs NumPy, the memetic workers share it; anneal, lns and penalty run slower on it)")
+	parser.add_argument("--lns-time", type=float, default=0.5, help="seconds per large neighbourhood subproblem")
+	parser.add_argument("--stats", help="append search statistics as JSON lines to this file")
+	parser.add_argument("--metrics", help="stream counters and timings of the descent as JSON lines to this file, host:port or - (stdout)")
+	parser.add_argument("--metrics-interval", type=float, help="seconds between two metrics records (default: 1)")
+	parser.add_argument("--seed", type=int)
+	parser.add_argument("--construct", action="store_true", help="start from a greedy assignment (randomised with --seed) instead of the initial solution")
+	parser.add_argument("--lower-bound", type=int, help="stop once the cost reaches this lower bound (see lowerbound.py), the assignment is optimal then")
+	parser.add_argument("--resume", action="store_true", help="start from the assignment in output_file if it holds a feasible one")
+	parser.add_argument("--verbose", action="store_true", help="log while reading the input files")
+	args = parser.parse_args()
+	if args.metrics_interval is not None and not args.metrics:
+		parser.error("--metrics-interval needs --metrics")
+	if args.metrics and args.strategy != "descent":
+		parser.error("--metrics is only supported with --strategy descent")
+	logging.basicConfig(format="LOG: %(message)s", level=logging.DEBUG if args.verbose else logging.WARNING)
+
+	# Read the instance and the assignment and initialise a new 
+	# ProcessAssignment object
+	try:
+		assignment = read_instance(args.instance_file, args.cache_dir)
+	except BaseException, e:
+		print("Could not initialize a ProcessAssignment.", file=sys.stderr)
+		print(repr(e), file=sys.stderr)
+		sys.exit(1)
+
+	try:
+		if args.initial_solution_file != "-":
+			assignment.update_assignment(filename=args.initial_solution_file)
+			original = assignment.clone()
+		if args.construct or args.initial_solution_file == "-":
+			from construction import construct
+			construct(assignment, random.Random(args.seed) if args.seed is not None else None)
+		if args.initial_solution_file == "-":
+			original = assignment.clone()
+	except BaseException, e:
+		print("Could not load the initial assignment.", file=sys.stderr)
+		print(repr(e), file=sys.stderr)
+		sys.exit(1)
+
+	outfile = args.output_file
+	if args.resume and outfile:
+		if load_checkpoint(assignment, outfile):
+			print("Resuming from", outfile)
+		else:
+			print("No usable checkpoint in", outfile, "- starting from", args.initial_solution_file)
+	checkpoint = CheckpointWriter(outfile) if outfile else None
+
+	signal.signal(signal.SIGTERM, _terminate)
+	budget = SearchBudget(args.time_limit, args.max_iterations, args.stall_sweeps)
+
+	def report(cost, proc_assignment):
+		print("New minima ",cost)
+		if checkpoint:
+			checkpoint.submit(proc_assignment.assignment)
+		if args.lower_bound is not None and cost <= args.lower_bound:
+			print("Lower bound reached, the assignment is optimal")
+			budget.stop()
+	rng = random.Random(args.seed)
+	stats = None
+	if args.stats:
+		statsfile = open(args.stats, 'a')
+
+		def stats(record):
+			statsfile.write(json.dumps(record) + "\n")
+			statsfile.flush()
+
+	if args.strategy == "anneal":
+		from annealing import anneal
+		best_cost, best_assignment, evaluations = anneal(assignment, original, args.schedule, budget=budget, rng=rng, report=report, stats=stats)
+	elif args.strategy == "tabu":
+		from tabu import tabu_search
+		best_cost, best_assignment, evaluations = tabu_search(assignment, original, args.tenure, budget=budget, rng=rng, report=report)
+	elif args.strategy == "lns":
+		from lns import lns
+		best_cost, best_assignment, evaluations = lns(assignment, original, iteration_time=args.lns_time, budget=budget, rng=rng, report=report)
+	elif args.strategy == "penalty":
+		from penalty import penalty_search
+		best_cost, best_assignment, evaluations = penalty_search(assignment, original, args.schedule, budget=budget, rng=rng, report=report, stats=stats)
+	elif args.strategy == "memetic":
+		from memetic import memetic
+		best_cost, best_assignment, evaluations = memetic(assignment, original, args.population, workers=args.workers, budget=budget, rng=rng, report=report, instance_file=args.instance_file, cache_dir=args.cache_dir)
 	else:
-		# Read the instance and the assignment and initialise a new 
-                # ProcessAssignment object
-		try:
-			assignment = ProcessAssignment(filename=sys.argv[1])
-			original = ProcessAssignment(filename=sys.argv[1])
-		except BaseException, e:
-			print("Could not initialize a ProcessAssignment.", file=sys.stderr)
-			print(repr(e), file=sys.stderr)
-			sys.exit(1)
-
-		try:
-			assignment.update_assignment(filename=sys.argv[2])
-			original.update_assignment(filename=sys.argv[2])
-		except BaseException, e:
-			print("Could not load the initial assignment.", file=sys.stderr)
-			print(repr(e), file=sys.stderr)
-			sys.exit(1)
-
-# TODO ===============================================
-		probe_neighbor(assignment, original)
-		
-# ====================================================		
-		# Print a representation of the instance and the assignment 
-        # to the given <output_file>
-		#if len(sys.argv) == 3:
-		#	# Print to stdout
-		#	outfile = None
-		#else:
-		#	outfile = sys.argv[3]
-		assignment.dump_instance(filename="dms_assignment1_small/human")
-		#dump_assignment(assignment.assignment, filename=outfile, mode='a')
+		metrics = None
+		if args.metrics:
+			from metrics import Metrics, open_sink
+			metrics = Metrics(open_sink(args.metrics), 1.0 if args.metrics_interval is None else args.metrics_interval)
+		best_cost, best_assignment, evaluations = probe_neighbor(assignment, original, report=report, rng=rng, budget=budget, kick=args.kick, metrics=metrics)
+		if metrics is not None and metrics.sink is not sys.stdout:
+			metrics.sink.close()
+	if args.stats:
+		statsfile.close()
+	elapsed = budget.elapsed()
+
+	if checkpoint:
+		checkpoint.close() # a pending checkpoint must not overwrite the final save
+		save_assignment(best_assignment, outfile)
+	else:
+		dump_real_assignment(best_assignment)
+		print("")
 
+	print("Final cost: %d" % best_cost)
+	print("Moves evaluated: %d" % evaluations)
+	print("Moves/sec: %.0f" % (evaluations / elapsed if elapsed > 0 else 0))
@@ -0,0 +1,185 @@
+# coding: utf-8
+
+# Simulated annealing for the process assignment problem. Candidate moves
+# are random relocations (checked with try_constraints) and random swaps
+# (checked with try_swap); their exact cost change comes from the O(R)
+# deltas of CostTracker, so accepting or rejecting a move never needs
+# global_cost. The temperature is controlled by a cooling schedule that is
+# updated once per epoch, and every epoch a stats record (temperature,
+# acceptance ratio, costs) can be streamed to a callback.
+
+from __future__ import print_function
+import math
+import random
+from ProcessAssignment import BestAssignment, CostTracker, SearchBudget, try_constraints, try_swap
+
+class CoolingSchedule(object):
+	"""Base class of the cooling schedules: holds the current temperature and
+	updates it at the end of every epoch from the acceptance ratio of the
+	epoch and whether it found a new best assignment."""
+
+	def __init__(self, temperature):
+		self.initial_temperature = temperature
+		self.temperature = temperature
+
+	def update(self, acceptance_ratio, improved):
+		"""Returns the temperature for the next epoch, which this base
+		schedule keeps constant."""
+		return self.temperature
+
+class GeometricCooling(CoolingSchedule):
+	"""T <- alpha * T after every epoch."""
+
+	def __init__(self, temperature, alpha=0.95):
+		CoolingSchedule.__init__(self, temperature)
+		self.alpha = alpha
+
+	def update(self, acceptance_ratio, improved):
+		self.temperature *= self.alpha
+		return self.temperature
+
+class AdaptiveCooling(CoolingSchedule):
+	"""Steers the temperature by the acceptance ratio: the target ratio
+	decays by decay every epoch, and the temperature is divided by step when
+	more moves than targeted were accepted and multiplied by step otherwise."""
+
+	def __init__(self, temperature, target=0.4, decay=0.95, step=1.1):
+		CoolingSchedule.__init__(self, temperature)
+		self.target = target
+		self.decay = decay
+		self.step = step
+
+	def update(self, acceptance_ratio, improved):
+		if acceptance_ratio > self.target:
+			self.temperature /= self.step
+		else:
+			self.temperature *= self.step
+		self.target *= self.decay
+		return self.temperature
+
+class ReheatingCooling(CoolingSchedule):
+	"""Wraps another schedule and reheats to factor times the initial
+	temperature after patience epochs in a row without a new best."""
+
+	def __init__(self, schedule, patience=20, factor=0.5):
+		CoolingSchedule.__init__(self, schedule.initial_temperature)
+		self.schedule = schedule
+		self.patience = patience
+		self.factor = factor
+		self.stalled = 0
+		self.reheats = 0
+
+	def update(self, acceptance_ratio, improved):
+		self.stalled = 0 if improved else self.stalled + 1
+		if self.stalled >= self.patience:
+			self.stalled = 0
+			self.reheats += 1
+			self.schedule.temperature = self.factor * self.initial_temperature
+		else:
+			self.schedule.update(acceptance_ratio, improved)
+		self.temperature = self.schedule.temperature
+		return self.temperature
+
+SCHEDULES = ["geometric", "adaptive", "reheating"]
+
+def make_schedule(name, temperature):
+	"""Cooling schedule by name, with the default parameters."""
+	if name == "geometric":
+		return GeometricCooling(temperature)
+	if name == "adaptive":
+		return AdaptiveCooling(temperature)
+	if name == "reheating":
+		return ReheatingCooling(GeometricCooling(temperature))
+	raise ValueError("Unknown cooling schedule: %s" % name)
+
+def _propose(proc_assignment, rng, swap_rate):
+	"""Random candidate move: ("move", process, machine) or ("swap", process, partner)."""
+	process = rng.randrange(proc_assignment.num_processes)
+	if rng.random() < swap_rate:
+		return "swap", process, rng.randrange(proc_assignment.num_processes)
+	return "move", process, rng.randrange(proc_assignment.num_machines)
+
+def _feasible_delta(cost_tracker, kind, process, target, check_constraints=True):
+	"""Exact cost delta of a candidate move, None if it violates a constraint
+	(never without check_constraints)."""
+	proc_assignment = cost_tracker.proc_assignment
+	if kind == "swap":
+		if check_constraints and not try_swap(proc_assignment, process, target):
+			return None
+		return cost_tracker.swap_delta(process, target)
+	if check_constraints and not try_constraints(proc_assignment, process, target):
+		return None
+	return cost_tracker.delta(process, target)
+
+def initial_temperature(cost_tracker, rng=random, samples=200, acceptance=0.5, swap_rate=0.2, check_constraints=True):
+	"""Temperature at which an average uphill move among samples random
+	candidates (only the feasible ones with check_constraints) is accepted
+	with probability acceptance."""
+	uphill = []
+	for sample in xrange(samples):
+		kind, process, target = _propose(cost_tracker.proc_assignment, rng, swap_rate)
+		delta = _feasible_delta(cost_tracker, kind, process, target, check_constraints)
+		if delta is not None and delta > 0:
+			uphill.append(delta)
+	if not uphill:
+		return 1.0
+	return -(float(sum(uphill)) / len(uphill)) / math.log(acceptance)
+
+def anneal(proc_assignment, original_assignment, schedule="geometric", budget=None, rng=random, report=None, stats=None, epoch_length=None, swap_rate=0.2, check_interval=0):
+	"""Simulated annealing from the current assignment. schedule is a
+	CoolingSchedule or one of SCHEDULES (started at initial_temperature).
+	An epoch is epoch_length proposals (num_processes by default); after
+	each one the schedule is updated and stats(record) receives a dict with
+	the iteration, elapsed time, temperature, acceptance ratio, current
+	cost and best cost. report(cost, proc_assignment) is called for every
+	new best. Stops and returns like probe_neighbor."""
+	if budget is None:
+		budget = SearchBudget()
+	if epoch_length is None:
+		epoch_length = proc_assignment.num_processes
+	cost_tracker = CostTracker(proc_assignment, original_assignment, check_interval)
+	if not isinstance(schedule, CoolingSchedule):
+		schedule = make_schedule(schedule, initial_temperature(cost_tracker, rng, swap_rate=swap_rate))
+
+	best = BestAssignment(proc_assignment, cost_tracker.total, report)
+	evaluations = 0
+	with best:
+		while not budget.exhausted():
+			accepted = 0
+			proposals = 0
+			improved = False
+			temperature = schedule.temperature
+			while proposals < epoch_length and not budget.exhausted():
+				kind, process, target = _propose(proc_assignment, rng, swap_rate)
+				proposals += 1
+				evaluations += 1
+				budget.iterations += 1
+				delta = _feasible_delta(cost_tracker, kind, process, target)
+				if delta is None:
+					continue
+				if delta > 0 and (temperature <= 0 or rng.random() >= math.exp(-delta / temperature)):
+					continue
+
+				if kind == "swap":
+					cost_tracker.swap(process, target)
+				else:
+					cost_tracker.move(process, target)
+				accepted += 1
+
+				if best.update(cost_tracker.total):
+					improved = True
+
+			acceptance_ratio = float(accepted) / proposals if proposals else 0.0
+			budget.end_sweep(improved)
+			if stats:
+				stats({
+					"iteration": budget.iterations,
+					"elapsed": budget.elapsed(),
+					"temperature": temperature,
+					"acceptance_ratio": acceptance_ratio,
+					"cost": cost_tracker.total,
+					"best_cost": best.cost,
+				})
+			schedule.update(acceptance_ratio, improved)
+
+	return best.cost, best.assignment, evaluations
@@ -0,0 +1,132 @@
+# coding: utf-8
+
+# Solves every instance_k.txt / initial_k.txt pair of an instance directory
+# (dms_assignment1_small, dms_assignment1_large, ...) in parallel and prints
+# a table with the initial cost, the final cost, the gap to localcost_k.txt,
+# the gap to the lower bound in lowerbound_k.txt (see lowerbound.py), the
+# runtime and the evaluation rate of each run. A run stops early once it
+# reaches the lower bound.
+
+from __future__ import print_function
+import os
+import re
+import sys
+import csv
+import json
+import random
+import argparse
+import multiprocessing
+from ProcessAssignment import SearchBudget, probe_neighbor, global_cost, read_instance, save_assignment
+
+FIELDS = ["instance", "initial_cost", "final_cost", "local_cost", "gap", "lower_bound", "optimality_gap", "runtime", "evaluations_per_sec"]
+
+def discover(directory):
+	"""Sorted list of the k for which directory has both instance_k.txt and initial_k.txt."""
+	numbers = []
+	for name in os.listdir(directory):
+		match = re.match(r"instance_(\d+)\.txt$", name)
+		if match and os.path.exists(os.path.join(directory, "initial_%s.txt" % match.group(1))):
+			numbers.append(int(match.group(1)))
+	return sorted(numbers)
+
+def _read_cost(filename):
+	"""Reads a single cost value (initialcost_k.txt, localcost_k.txt, lowerbound_k.txt), None if there is no such file."""
+	if not os.path.exists(filename):
+		return None
+	with open(filename) as costfile:
+		return int(costfile.read().split()[0])
+
+def solve(directory, k, time_limit=None, max_iterations=None, stall_sweeps=None, seed=None, output_dir=None, cache_dir=None):
+	"""Solves instance k of directory and returns its row of the results
+	table. With a cache_dir the instance is memory-mapped from its binary
+	cache there (see read_instance)."""
+	instance_file = os.path.join(directory, "instance_%d.txt" % k)
+	initial_file = os.path.join(directory, "initial_%d.txt" % k)
+	assignment = read_instance(instance_file, cache_dir)
+	assignment.update_assignment(filename=initial_file)
+	original = assignment.clone()
+
+	initial_cost = global_cost(assignment, original)
+	lower_bound = _read_cost(os.path.join(directory, "lowerbound_%d.txt" % k))
+	budget = SearchBudget(time_limit, max_iterations, stall_sweeps)
+
+	def report(cost, proc_assignment):
+		if lower_bound is not None and cost <= lower_bound:
+			budget.stop() # proven optimal
+
+	final_cost, best_assignment, evaluations = probe_neighbor(assignment, original, report=report, rng=random.Random(seed), budget=budget)
+	runtime = budget.elapsed()
+
+	if output_dir:
+		save_assignment(best_assignment, os.path.join(output_dir, "solution_%d.txt" % k))
+
+	local_cost = _read_cost(os.path.join(directory, "localcost_%d.txt" % k))
+	gap = None
+	if local_cost:
+		gap = float(final_cost - local_cost) / local_cost
+	optimality_gap = None
+	if lower_bound is not None:
+		optimality_gap = float(final_cost - lower_bound) / max(final_cost, 1)
+	return {
+		"instance": k,
+		"initial_cost": initial_cost,
+		"final_cost": final_cost,
+		"local_cost": local_cost,
+		"gap": gap,
+		"lower_bound": lower_bound,
+		"optimality_gap": optimality_gap,
+		"runtime": runtime,
+		"evaluations_per_sec": evaluations / runtime if runtime > 0 else 0.0,
+	}
+
+def _solve(args):
+	"""Pool.map adapter for solve."""
+	return solve(*args)
+
+def solve_directory(directory, workers=None, time_limit=None, max_iterations=None, stall_sweeps=None, seed=None, output_dir=None, cache_dir=None):
+	"""Solves all instances of directory on a pool of workers and returns the rows sorted by k."""
+	numbers = discover(directory)
+	jobs = [(directory, k, time_limit, max_iterations, stall_sweeps, seed, output_dir, cache_dir) for k in numbers]
+	pool = multiprocessing.Pool(workers)
+	try:
+		rows = pool.map(_solve, jobs)
+	finally:
+		pool.close()
+		pool.join()
+	return rows
+
+def write_table(rows, f, fmt="csv"):
+	"""Writes the results table as CSV or JSON to the file object f."""
+	if fmt == "json":
+		json.dump(rows, f, indent=2, sort_keys=True)
+		f.write("\n")
+	else:
+		writer = csv.DictWriter(f, FIELDS)
+		writer.writeheader()
+		writer.writerows(rows)
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Solve all instances of a directory in parallel.")
+	parser.add_argument("directory")
+	parser.add_argument("--workers", type=int, help="parallel solver processes (default: one per core)")
+	parser.add_argument("--time-limit", type=float, help="seconds per instance")
+	parser.add_argument("--max-iterations", type=int, help="process steps per instance")
+	parser.add_argument("--stall-sweeps", type=int, help="sweeps without a new minimum per instance")
+	parser.add_argument("--seed", type=int)
+	parser.add_argument("--output-dir", help="write the best assignment of instance k to solution_k.txt here")
+	parser.add_argument("--cache-dir", help="memory-map binary copies of the instances kept in this directory instead of parsing the text files (needs NumPy)")
+	parser.add_argument("--format", choices=["csv", "json"], default="csv")
+	parser.add_argument("--table", help="write the table to this file instead of stdout")
+	args = parser.parse_args()
+
+	if args.time_limit is None and args.max_iterations is None and args.stall_sweeps is None:
+		parser.error("give at least one of --time-limit, --max-iterations and --stall-sweeps")
+	if args.output_dir and not os.path.isdir(args.output_dir):
+		os.makedirs(args.output_dir)
+
+	rows = solve_directory(args.directory, args.workers, args.time_limit, args.max_iterations, args.stall_sweeps, args.seed, args.output_dir, args.cache_dir)
+	if args.table:
+		with open(args.table, "w") as f:
+			write_table(rows, f, args.format)
+	else:
+		write_table(rows, sys.stdout, args.format)
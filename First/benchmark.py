@@ -0,0 +1,127 @@
+# coding: utf-8
+
+# Benchmarks of the hot paths of the local search on the shipped instances:
+# shared_processes, try_constraints, local_cost_delta, global_cost,
+# evaluate_moves, one full probe_neighbor sweep and a fixed-seed search.
+# Results (operations per second and peak memory) can be saved as a JSON
+# baseline, and later runs fail when throughput drops by more than a given
+# percentage against that baseline.
+
+from __future__ import print_function
+import os
+import sys
+import json
+import time
+import random
+import resource
+import argparse
+from ProcessAssignment import ProcessAssignment, SearchBudget, shared_processes, try_constraints, local_cost_delta, global_cost, probe_neighbor
+from batch import discover
+
+def _load(directory, k):
+	"""Returns (assignment, original) for instance k of directory."""
+	instance_file = os.path.join(directory, "instance_%d.txt" % k)
+	initial_file = os.path.join(directory, "initial_%d.txt" % k)
+	assignment = ProcessAssignment(filename=instance_file)
+	assignment.update_assignment(filename=initial_file)
+	original = assignment.clone()
+	return assignment, original
+
+def _rate(function, calls, repeat=3):
+	"""Calls function on every element of calls and returns the calls per
+	second of the fastest of repeat rounds, which is the least noisy figure."""
+	best = None
+	for round in xrange(repeat):
+		start = time.time()
+		for args in calls:
+			function(*args)
+		elapsed = time.time() - start
+		if best is None or elapsed < best:
+			best = elapsed
+	return len(calls) / best if best > 0 else float("inf")
+
+def _search_rate(directory, k, iterations, seed, repeat=3):
+	"""Iterations per second of a fixed-seed probe_neighbor run of the given
+	number of iterations from the initial assignment of instance k, the
+	fastest of repeat runs as in _rate."""
+	best = None
+	for round in xrange(repeat):
+		assignment, original = _load(directory, k)
+		budget = SearchBudget(max_iterations=iterations)
+		probe_neighbor(assignment, original, rng=random.Random(seed), budget=budget)
+		elapsed = budget.elapsed()
+		if best is None or elapsed < best:
+			best = elapsed
+	return iterations / best if best > 0 else float("inf")
+
+def benchmark_instance(directory, k, operations=2000, iterations=1000, seed=0):
+	"""Operations per second of every benchmark on instance k of directory."""
+	assignment, original = _load(directory, k)
+	rng = random.Random(seed)
+	moves = [(rng.randrange(assignment.num_processes), rng.randrange(assignment.num_machines)) for i in xrange(operations)]
+
+	rates = {}
+	rates["shared_processes"] = _rate(lambda process, machine: shared_processes(assignment, machine, assignment.assignment), moves)
+	rates["try_constraints"] = _rate(lambda process, machine: try_constraints(assignment, process, machine), moves)
+	rates["local_cost_delta"] = _rate(lambda process, machine: local_cost_delta(assignment, process, machine, original), moves)
+	rates["global_cost"] = _rate(lambda process, machine: global_cost(assignment, original), moves[:operations // 10])
+	rates["evaluate_moves"] = _rate(lambda process, machine: assignment.evaluate_moves(process, original), moves[:operations // 10])
+
+	# one sweep visits every process but the last once
+	rates["probe_neighbor_sweep"] = _search_rate(directory, k, assignment.num_processes - 1, seed) / (assignment.num_processes - 1)
+	rates["search_iterations"] = _search_rate(directory, k, iterations, seed)
+	return rates
+
+def run(directory, numbers=None, operations=2000, iterations=1000, seed=0):
+	"""Runs the benchmarks on the instances numbers (all by default) of directory
+	and returns the mean rates together with the peak memory in kilobytes."""
+	if numbers is None:
+		numbers = discover(directory)
+	totals = {}
+	for k in numbers:
+		for name, rate in benchmark_instance(directory, k, operations, iterations, seed).items():
+			totals[name] = totals.get(name, 0.0) + rate
+	results = {"ops_per_sec": dict((name, total / len(numbers)) for name, total in totals.items())}
+	# ru_maxrss is in kilobytes on Linux
+	results["peak_memory_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	results["instances"] = [os.path.join(directory, "instance_%d.txt" % k) for k in numbers]
+	return results
+
+def regressions(results, baseline, tolerance):
+	"""Benchmarks whose throughput dropped more than tolerance percent below the baseline."""
+	slower = []
+	for name, base_rate in sorted(baseline["ops_per_sec"].items()):
+		rate = results["ops_per_sec"].get(name)
+		if rate is not None and rate < base_rate * (1 - tolerance / 100.0):
+			slower.append((name, base_rate, rate))
+	return slower
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Benchmark the process assignment hot paths.")
+	parser.add_argument("--directory", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "dms_assignment1_large"))
+	parser.add_argument("--instances", type=int, nargs="+", help="instance numbers (default: all)")
+	parser.add_argument("--operations", type=int, default=2000, help="calls per primitive")
+	parser.add_argument("--iterations", type=int, default=1000, help="iterations of the fixed-seed search")
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--baseline", default="benchmark_baseline.json", help="JSON baseline to compare against or to save")
+	parser.add_argument("--save", action="store_true", help="save the results as the new baseline")
+	parser.add_argument("--tolerance", type=float, default=10.0, help="allowed throughput drop in percent")
+	args = parser.parse_args()
+
+	results = run(args.directory, args.instances, args.operations, args.iterations, args.seed)
+	for name, rate in sorted(results["ops_per_sec"].items()):
+		print("%-22s %14.1f ops/sec" % (name, rate))
+	print("%-22s %14d kB" % ("peak memory", results["peak_memory_kb"]))
+
+	if args.save:
+		with open(args.baseline, "w") as f:
+			json.dump(results, f, indent=2, sort_keys=True)
+		print("Saved baseline to %s" % args.baseline)
+	elif os.path.exists(args.baseline):
+		with open(args.baseline) as f:
+			baseline = json.load(f)
+		slower = regressions(results, baseline, args.tolerance)
+		for name, base_rate, rate in slower:
+			print("REGRESSION %s: %.1f -> %.1f ops/sec (%.1f%%)" % (name, base_rate, rate, 100.0 * (rate - base_rate) / base_rate), file=sys.stderr)
+		if slower:
+			sys.exit(1)
@@ -0,0 +1,106 @@
+# coding: utf-8
+
+# Greedy construction of a feasible assignment from the instance alone, so
+# that a search does not need an initial solution file. Processes are
+# placed largest first (best-fit-decreasing): the size of a process is
+# its requirement vector relative to the total soft capacity of each
+# resource, and it goes to the feasible machine where it adds the least
+# load above the soft capacities, ties broken by the least soft capacity
+# left over. SCCon is kept with the set of machines of every service;
+# SSCon with the locations of every service and the number of its
+# processes still to place: once that number is down to the locations the
+# service still misses, each of them must open a new location. With an
+# rng the order and the machine scores get random noise, which gives
+# diverse starting points for restarts.
+
+from __future__ import print_function
+import random
+from ProcessAssignment import AssignmentError
+
+def _sizes(proc_assignment):
+	"""Requirement vector of every process, each resource relative to its
+	total soft capacity over all machines."""
+	pa = proc_assignment
+	totals = [max(sum(pa.soft_machine_capacities[machine][resource] for machine in xrange(pa.num_machines)), 1) for resource in xrange(pa.num_resources)]
+	return [sum(float(pa.process_requirements[process][resource]) / totals[resource] for resource in xrange(pa.num_resources)) for process in xrange(pa.num_processes)]
+
+def greedy_assignment(proc_assignment, rng=None, noise=0.2):
+	"""One best-fit-decreasing pass over the instance of proc_assignment
+	(its current assignment is ignored). Returns the assignment as a list,
+	or None if some process could not be placed. With an rng, sizes and
+	machine scores are multiplied by random factors in [1, 1 + noise]."""
+	pa = proc_assignment
+	resources = xrange(pa.num_resources)
+	sizes = _sizes(pa)
+	if rng is not None:
+		sizes = [size * (1 + noise * rng.random()) for size in sizes]
+	order = sorted(xrange(pa.num_processes), key=lambda process: -sizes[process])
+
+	loads = [[0] * pa.num_resources for machine in xrange(pa.num_machines)]
+	service_machines = [set() for service in xrange(pa.num_services)]
+	service_locations = [set() for service in xrange(pa.num_services)]
+	remaining = [0] * pa.num_services # processes of the service not placed yet
+	for process in xrange(pa.num_processes):
+		remaining[pa.process_services[process]] += 1
+
+	assignment = [None] * pa.num_processes
+	for process in order:
+		service = pa.process_services[process]
+		requirements = pa.process_requirements[process]
+		missing = pa.service_min_spreads[service] - len(service_locations[service])
+		new_location_only = remaining[service] <= missing
+
+		best_machine = None
+		best_score = None
+		for machine in xrange(pa.num_machines):
+			if machine in service_machines[service]:
+				continue
+			if new_location_only and pa.machine_locations[machine] in service_locations[service]:
+				continue
+			load = loads[machine]
+			capacity = pa.machine_capacities[machine]
+			soft = pa.soft_machine_capacities[machine]
+			added = 0
+			slack = 0
+			for resource in resources:
+				new_load = load[resource] + requirements[resource]
+				if new_load > capacity[resource]:
+					break
+				added += max(new_load - soft[resource], 0) - max(load[resource] - soft[resource], 0)
+				slack += max(soft[resource] - new_load, 0)
+			else:
+				score = (added, slack)
+				if rng is not None:
+					score = (added * (1 + noise * rng.random()), slack * (1 + noise * rng.random()))
+				if best_score is None or score < best_score:
+					best_machine = machine
+					best_score = score
+		if best_machine is None:
+			return None
+
+		assignment[process] = best_machine
+		load = loads[best_machine]
+		for resource in resources:
+			load[resource] += requirements[resource]
+		service_machines[service].add(best_machine)
+		service_locations[service].add(pa.machine_locations[best_machine])
+		remaining[service] -= 1
+	return assignment
+
+def construct(proc_assignment, rng=None, noise=0.2, attempts=10):
+	"""Replaces the assignment of proc_assignment with a greedy one. The
+	first pass is deterministic unless an rng is given; failed passes are
+	retried with noise (from rng, or a fixed seed) up to attempts times
+	before an AssignmentError is raised."""
+	assignment = greedy_assignment(proc_assignment, rng, noise)
+	if assignment is None and rng is None:
+		rng = random.Random(0)
+	attempt = 1
+	while assignment is None:
+		if attempt >= attempts:
+			raise AssignmentError("No feasible assignment found in %d greedy passes" % attempts)
+		assignment = greedy_assignment(proc_assignment, rng, max(noise, 0.2) * (1 + attempt))
+		attempt += 1
+	proc_assignment.assignment = assignment
+	proc_assignment._build_state()
+	return proc_assignment
@@ -0,0 +1,205 @@
+# coding: utf-8
+
+# Large neighbourhood search for the process assignment problem. Every
+# iteration frees all processes of a few machines (the most overloaded
+# machine plus random ones, the machines of one location, or random
+# machines) and reassigns them to the same machines optimally with a small
+# depth-first branch and bound over MCCon, SCCon and SSCon. The better
+# arrangement, if any, is spliced back into the assignment through the
+# CostTracker. The number of machines per subproblem adapts to a time
+# budget per iteration.
+
+from __future__ import print_function
+import time
+import random
+from ProcessAssignment import BestAssignment, CostTracker, SearchBudget
+
+STRATEGIES = ["overloaded", "location", "random"]
+
+def pick_machines(proc_assignment, size, strategy, rng=random):
+	"""size distinct machines to reoptimise, chosen by strategy (see STRATEGIES)."""
+	size = min(size, proc_assignment.num_machines)
+	machines = xrange(proc_assignment.num_machines)
+	if strategy == "overloaded":
+		# one of the most overloaded machines with random partners to shed load onto
+		worst = sorted(machines, key=lambda machine: -proc_assignment.machine_load_cost(machine))[:size]
+		chosen = [rng.choice(worst)]
+		others = [machine for machine in machines if machine != chosen[0]]
+		return chosen + rng.sample(others, size - 1)
+	if strategy == "location":
+		location = proc_assignment.machine_locations[rng.randrange(proc_assignment.num_machines)]
+		local = [machine for machine in machines if proc_assignment.machine_locations[machine] == location]
+		if len(local) >= size:
+			return rng.sample(local, size)
+		others = [machine for machine in machines if proc_assignment.machine_locations[machine] != location]
+		return local + rng.sample(others, size - len(local))
+	if strategy == "random":
+		return rng.sample(machines, size)
+	raise ValueError("Unknown LNS strategy: %s" % strategy)
+
+class Subproblem(object):
+	"""Optimal reassignment of the processes on machines to machines by depth
+	first branch and bound. The objective is the load cost of these machines
+	plus the moving costs of their processes, which is exactly the part of
+	the total cost the reassignment can change."""
+
+	def __init__(self, proc_assignment, original_assignment, machines, node_limit=None, deadline=None):
+		pa = proc_assignment
+		self.proc_assignment = pa
+		self.machines = list(machines)
+		self.node_limit = node_limit
+		self.deadline = deadline
+		self.original = [original_assignment.assignment[process] for process in xrange(pa.num_processes)]
+
+		processes = []
+		for machine in self.machines:
+			processes.extend(pa.machine_processes[machine])
+		# big processes first: they are the hardest to place and shape the bound early
+		self.processes = sorted(processes, key=lambda process: -sum(pa.process_requirements[process]))
+
+		self.loads = [[0] * pa.num_resources for machine in self.machines]
+		self.services = [set() for machine in self.machines]
+
+		# per service: location counts without the freed processes, their
+		# number of distinct locations and how many freed processes are left
+		self.location_counts = {}
+		self.spread = {}
+		self.remaining = {}
+		for process in self.processes:
+			service = pa.process_services[process]
+			if service not in self.location_counts:
+				self.location_counts[service] = list(pa.service_locations[service])
+				self.remaining[service] = 0
+			self.location_counts[service][pa.machine_locations[pa.assignment[process]]] -= 1
+			self.remaining[service] += 1
+		for service, counts in self.location_counts.iteritems():
+			self.spread[service] = sum(1 for count in counts if count > 0)
+
+		# moving costs that cannot be avoided by the processes from depth on
+		self.bound = [0] * (len(self.processes) + 1)
+		for depth in xrange(len(self.processes) - 1, -1, -1):
+			process = self.processes[depth]
+			unavoidable = pa.process_moving_costs[process] if self.original[process] not in self.machines else 0
+			self.bound[depth] = self.bound[depth + 1] + unavoidable
+
+		self.placement = [pa.assignment[process] for process in self.processes]
+		self.best_placement = list(self.placement)
+		self.best_cost = self.current_cost()
+		self.nodes = 0
+		self.complete = True
+
+	def current_cost(self):
+		"""Cost of the part of the assignment the subproblem controls, as it is now."""
+		pa = self.proc_assignment
+		cost = sum(pa.machine_load_cost(machine) for machine in self.machines)
+		for process in self.processes:
+			if pa.assignment[process] != self.original[process]:
+				cost += pa.process_moving_costs[process]
+		return cost
+
+	def solve(self):
+		"""Searches the placements, returns True if the search was exhaustive."""
+		self._search(0, 0)
+		return self.complete
+
+	def _search(self, depth, cost):
+		self.nodes += 1
+		if (self.node_limit is not None and self.nodes > self.node_limit) or (self.deadline is not None and self.nodes % 256 == 0 and time.time() > self.deadline):
+			self.complete = False
+		if not self.complete or cost + self.bound[depth] >= self.best_cost:
+			return
+		if depth == len(self.processes):
+			self.best_cost = cost
+			self.best_placement = list(self.placement)
+			return
+
+		pa = self.proc_assignment
+		process = self.processes[depth]
+		service = pa.process_services[process]
+		requirements = pa.process_requirements[process]
+		moving_cost = pa.process_moving_costs[process]
+
+		options = []
+		for index, machine in enumerate(self.machines):
+			if service in self.services[index]: # SCCon
+				continue
+			load = self.loads[index]
+			capacity = pa.machine_capacities[machine]
+			soft = pa.soft_machine_capacities[machine]
+			increase = 0 if machine == self.original[process] else moving_cost
+			for resource in xrange(pa.num_resources):
+				new_load = load[resource] + requirements[resource]
+				if new_load > capacity[resource]: # MCCon
+					break
+				increase += max(new_load - soft[resource], 0) - max(load[resource] - soft[resource], 0)
+			else:
+				options.append((increase, index))
+		options.sort()
+
+		counts = self.location_counts[service]
+		min_spread = pa.service_min_spreads[service]
+		for increase, index in options:
+			machine = self.machines[index]
+			location = pa.machine_locations[machine]
+			new_location = counts[location] == 0
+			# SSCon: every freed process left can still add at most one location
+			if self.spread[service] + new_location + self.remaining[service] - 1 < min_spread:
+				continue
+
+			load = self.loads[index]
+			for resource in xrange(pa.num_resources):
+				load[resource] += requirements[resource]
+			self.services[index].add(service)
+			counts[location] += 1
+			self.spread[service] += new_location
+			self.remaining[service] -= 1
+			self.placement[depth] = machine
+
+			self._search(depth + 1, cost + increase)
+
+			self.remaining[service] += 1
+			self.spread[service] -= new_location
+			counts[location] -= 1
+			self.services[index].discard(service)
+			for resource in xrange(pa.num_resources):
+				load[resource] -= requirements[resource]
+			if not self.complete:
+				return
+
+def lns(proc_assignment, original_assignment, machines=3, strategy=None, iteration_time=0.5, node_limit=None, budget=None, rng=random, report=None, check_interval=0):
+	"""Large neighbourhood search from the current assignment. Subproblems
+	start with machines machines, picked by strategy (one of STRATEGIES, a
+	random one each iteration if None). A subproblem that is solved in less
+	than half of iteration_time seconds makes the next one a machine larger,
+	one that runs out of time (or node_limit) makes it a machine smaller.
+	Stops like probe_neighbor; the evaluations it returns are branch and
+	bound nodes. report(cost, proc_assignment) is called for every new best."""
+	if budget is None:
+		budget = SearchBudget()
+	cost_tracker = CostTracker(proc_assignment, original_assignment, check_interval)
+	best = BestAssignment(proc_assignment, cost_tracker.total, report)
+	evaluations = 0
+	size = machines
+	with best:
+		while not budget.exhausted():
+			started = time.time()
+			chosen = pick_machines(proc_assignment, size, strategy or rng.choice(STRATEGIES), rng)
+			subproblem = Subproblem(proc_assignment, original_assignment, chosen, node_limit, started + iteration_time)
+			before = subproblem.best_cost
+			complete = subproblem.solve()
+			evaluations += subproblem.nodes
+			budget.iterations += 1
+
+			if complete and time.time() - started < iteration_time / 2:
+				size = min(size + 1, proc_assignment.num_machines)
+			elif not complete:
+				size = max(size - 1, 2)
+
+			improved = False
+			if subproblem.best_cost < before:
+				for process, machine in zip(subproblem.processes, subproblem.best_placement):
+					cost_tracker.move(process, machine)
+				improved = best.update(cost_tracker.total)
+			budget.end_sweep(improved)
+
+	return best.cost, best.assignment, evaluations
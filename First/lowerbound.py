@@ -0,0 +1,121 @@
+# coding: utf-8
+
+# Lower bounds for the process assignment problem from an lp_solve model,
+# written in the LP format of the Second/ assignment (min: ...; rows;
+# bin ...;). Variables:
+#   x_p_m  process p runs on machine m (only where p fits into m at all)
+#   o_m_r  load of machine m above the soft capacity of resource r
+#   y_s_l  service s has a process in location l (services with spread > 1)
+# Rows:
+#   a_p       sum_m x_p_m = 1
+#   mc_m_r    sum_p req_p_r x_p_m <= capacity_m_r          (MCCon)
+#   lc_m_r    sum_p req_p_r x_p_m - o_m_r <= soft_m_r      (load cost)
+#   sc_s_m    sum_{p in s} x_p_m <= 1                      (SCCon)
+#   ly_s_l    y_s_l <= sum_{p in s, m in l} x_p_m
+#   ss_s      sum_l y_s_l >= spread_s                      (SSCon)
+# The objective is sum o_m_r plus the moving costs, written as
+# sum_p mc_p - sum_p mc_p x_p_original. With bin declarations this is the
+# exact MIP, with --relax its LP relaxation, which lp_solve solves quickly
+# and whose optimum (rounded up, all costs are integers) bounds the cost of
+# every assignment from below. The large instances give models with about
+# 200000 variables, so the model is written row by row instead of being
+# built in memory. Solve it with lp_solve (e.g. lp_solve -S3 model.lp, see
+# Second/) and write the objective value, rounded up, to lowerbound_k.txt
+# next to the instance for batch.py and --lower-bound.
+
+from __future__ import print_function
+import argparse
+from ProcessAssignment import ProcessAssignment
+
+def _fits(proc_assignment, process, machine):
+	"""Whether process alone fits into machine (else x_p_m is left out)."""
+	requirements = proc_assignment.process_requirements[process]
+	capacity = proc_assignment.machine_capacities[machine]
+	return all(requirements[resource] <= capacity[resource] for resource in xrange(proc_assignment.num_resources))
+
+def _terms(coefficients):
+	"""' +3 x_1_2 +x_4_2 ...' for a list of (coefficient, variable)."""
+	return "".join(" +%s" % variable if coefficient == 1 else " %+d %s" % (coefficient, variable) for coefficient, variable in coefficients)
+
+def write_model(proc_assignment, original_assignment, f, relax=False):
+	"""Writes the model of the instance of proc_assignment, with moving costs
+	against original_assignment, to the file object f. relax leaves out the
+	bin declarations (the LP relaxation)."""
+	pa = proc_assignment
+	resources = xrange(pa.num_resources)
+	candidates = [[machine for machine in xrange(pa.num_machines) if _fits(pa, process, machine)] for process in xrange(pa.num_processes)]
+	on_machine = [[] for machine in xrange(pa.num_machines)]
+	for process in xrange(pa.num_processes):
+		for machine in candidates[process]:
+			on_machine[machine].append(process)
+	services = [[] for service in xrange(pa.num_services)]
+	for process in xrange(pa.num_processes):
+		services[pa.process_services[process]].append(process)
+	spread_services = [service for service in xrange(pa.num_services) if pa.service_min_spreads[service] > 1]
+
+	# Objective: load above the soft capacities plus moving costs
+	f.write("/* Process assignment lower bound */\nmin:")
+	for machine in xrange(pa.num_machines):
+		f.write("".join(" +o_%d_%d" % (machine, resource) for resource in resources))
+	moving_costs = 0
+	for process in xrange(pa.num_processes):
+		cost = pa.process_moving_costs[process]
+		original_machine = original_assignment.assignment[process]
+		if cost and original_machine in candidates[process]:
+			f.write(" -%d x_%d_%d" % (cost, process, original_machine))
+		moving_costs += cost
+	f.write(" +%d;\n\n" % moving_costs)
+
+	# Every process runs on exactly one machine
+	for process in xrange(pa.num_processes):
+		f.write("a_%d:%s = 1;\n" % (process, _terms((1, "x_%d_%d" % (process, machine)) for machine in candidates[process])))
+
+	# MCCon and the load above the soft capacities
+	for machine in xrange(pa.num_machines):
+		capacity = pa.machine_capacities[machine]
+		soft = pa.soft_machine_capacities[machine]
+		for resource in resources:
+			load = _terms((pa.process_requirements[process][resource], "x_%d_%d" % (process, machine)) for process in on_machine[machine] if pa.process_requirements[process][resource])
+			if not load:
+				continue
+			f.write("mc_%d_%d:%s <= %d;\n" % (machine, resource, load, capacity[resource]))
+			f.write("lc_%d_%d:%s -o_%d_%d <= %d;\n" % (machine, resource, load, machine, resource, soft[resource]))
+
+	# SCCon
+	for service in xrange(pa.num_services):
+		if len(services[service]) < 2:
+			continue
+		for machine in xrange(pa.num_machines):
+			variables = ["x_%d_%d" % (process, machine) for process in services[service] if machine in candidates[process]]
+			if len(variables) > 1:
+				f.write("sc_%d_%d:%s <= 1;\n" % (service, machine, _terms((1, variable) for variable in variables)))
+
+	# SSCon through the location indicators
+	for service in spread_services:
+		for location in xrange(pa.num_locations):
+			variables = ["x_%d_%d" % (process, machine) for process in services[service] for machine in candidates[process] if pa.machine_locations[machine] == location]
+			f.write("ly_%d_%d: y_%d_%d%s <= 0;\n" % (service, location, service, location, "".join(" -%s" % variable for variable in variables)))
+		f.write("ss_%d:%s >= %d;\n" % (service, _terms((1, "y_%d_%d" % (service, location)) for location in xrange(pa.num_locations)), pa.service_min_spreads[service]))
+	for service in spread_services:
+		for location in xrange(pa.num_locations):
+			f.write("y_%d_%d <= 1;\n" % (service, location))
+
+	if not relax:
+		f.write("\n")
+		for process in xrange(pa.num_processes):
+			f.write("bin %s;\n" % ", ".join("x_%d_%d" % (process, machine) for machine in candidates[process]))
+		for service in spread_services:
+			f.write("bin %s;\n" % ", ".join("y_%d_%d" % (service, location) for location in xrange(pa.num_locations)))
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Write an lp_solve model (MIP or LP relaxation) of a process assignment instance.")
+	parser.add_argument("instance_file")
+	parser.add_argument("initial_solution_file")
+	parser.add_argument("model_file")
+	parser.add_argument("--relax", action="store_true", help="write the LP relaxation (no bin declarations)")
+	args = parser.parse_args()
+
+	assignment = ProcessAssignment(filename=args.instance_file)
+	assignment.update_assignment(filename=args.initial_solution_file)
+	with open(args.model_file, "w") as f:
+		write_model(assignment, assignment, f, args.relax)
@@ -0,0 +1,277 @@
+# coding: utf-8
+
+# Memetic search for the process assignment problem: a population of
+# feasible assignments (array('i') vectors) evolves by recombining two
+# parents picked by tournament. Crossover is machine-wise (the child takes
+# the processes of a random half of the machines from one parent and the
+# rest from the other) or service-wise (all processes of a service come
+# from the same parent, which keeps SCCon and SSCon). A repair step then
+# moves the processes that break MCCon, SCCon or SSCon to the machines that
+# reduce the violations most, and every repaired child is polished with
+# sweeps of probe_neighbor. Children are made and polished in a pool of
+# worker processes; only the parents and the children travel between the
+# processes. Given a cache directory (and NumPy) the workers search on an
+# ArrayInstance memory-mapped from the binary instance cache
+# (vectorised.load_instance), whose pages all of them share. Otherwise
+# they inherit a tuple based copy from the fork, which is shared only
+# until reference counting writes to its pages. A child replaces the
+# worst member unless it lies within min_distance (Hamming distance) of a
+# member, in which case it can only replace that member if it is better.
+
+from __future__ import print_function
+import random
+import signal
+import logging
+import multiprocessing
+from array import array
+from itertools import izip
+from ProcessAssignment import BestAssignment, InstanceError, InvalidArgumentException, SearchBudget, global_cost, local_cost_delta, probe_neighbor
+from penalty import ViolationTracker
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+CROSSOVERS = ["machine", "service"]
+
+logger = logging.getLogger(__name__)
+
+# (proc_assignment, original_assignment) of the worker processes, set before
+# the pool forks, see _shared_assignments
+_shared = []
+
+def hamming(assignment, other):
+	"""Number of processes on different machines in the two assignments.
+	Compared as int32 buffers with NumPy when both are array('i')."""
+	if np is not None and isinstance(assignment, array) and isinstance(other, array):
+		return int(np.count_nonzero(np.frombuffer(assignment, np.intc) != np.frombuffer(other, np.intc)))
+	return sum(1 for machine, other_machine in izip(assignment, other) if machine != other_machine)
+
+def crossover(proc_assignment, parent, other, kind, rng=random):
+	"""Child assignment (a list) of parent and other, see CROSSOVERS. It
+	may break the constraints."""
+	pa = proc_assignment
+	if kind == "machine":
+		chosen = set(rng.sample(xrange(pa.num_machines), pa.num_machines // 2))
+		child = list(parent)
+		for process in xrange(pa.num_processes):
+			if parent[process] not in chosen and other[process] not in chosen:
+				child[process] = other[process]
+		return child
+	if kind == "service":
+		take_other = [rng.random() < 0.5 for service in xrange(pa.num_services)]
+		return [other[process] if take_other[pa.process_services[process]] else parent[process] for process in xrange(pa.num_processes)]
+	raise ValueError("Unknown crossover: %s" % kind)
+
+def _violating_processes(proc_assignment):
+	"""Processes on machines above their hard capacity, sharing a machine
+	with their service, or of a service short of its spread (in a location
+	the service has more than one process in)."""
+	pa = proc_assignment
+	processes = set()
+	for machine in xrange(pa.num_machines):
+		load = pa.machine_loads[machine]
+		capacity = pa.machine_capacities[machine]
+		if any(load[resource] > capacity[resource] for resource in xrange(pa.num_resources)):
+			processes.update(pa.machine_processes[machine])
+	for process in xrange(pa.num_processes):
+		service = pa.process_services[process]
+		machine = pa.assignment[process]
+		if pa.service_machines[service][machine] > 1:
+			processes.add(process)
+		elif pa.service_spreads[service] < pa.service_min_spreads[service] and pa.service_locations[service][pa.machine_locations[machine]] > 1:
+			processes.add(process)
+	return processes
+
+def repair(proc_assignment, original_assignment, rng=random):
+	"""Makes proc_assignment feasible: every violating process (in random
+	order) moves to the machine that reduces the total violation most,
+	ties going to the cheaper move, until MCCon, SCCon and SSCon hold.
+	Returns False if a whole pass finds no move that reduces the violations."""
+	pa = proc_assignment
+	violations = ViolationTracker(pa)
+	while not violations.feasible():
+		processes = list(_violating_processes(pa))
+		rng.shuffle(processes)
+		progress = False
+		for process in processes:
+			best_machine = None
+			best_key = None
+			for machine in xrange(pa.num_machines):
+				delta = violations.delta(process, machine)
+				reduction = sum(delta)
+				if reduction >= 0:
+					continue
+				key = (reduction, local_cost_delta(pa, process, machine, original_assignment))
+				if best_key is None or key < best_key:
+					best_machine = machine
+					best_key = key
+			if best_machine is not None:
+				violations.move(process, best_machine)
+				pa.move(process, best_machine)
+				progress = True
+				if violations.feasible():
+					return True
+		if not progress:
+			return False
+	return True
+
+def polish(proc_assignment, original_assignment, sweeps=1, rng=random):
+	"""sweeps sweeps of probe_neighbor, returns (cost, assignment, moves evaluated)."""
+	budget = SearchBudget(max_iterations=sweeps * (proc_assignment.num_processes - 1))
+	return probe_neighbor(proc_assignment, original_assignment, rng=rng, budget=budget)
+
+def _shared_assignments(proc_assignment, original_assignment, instance_file=None, cache_dir=None):
+	"""Copies of proc_assignment and original_assignment for the workers:
+	on the ArrayInstance of instance_file memory-mapped from cache_dir if
+	both are given and NumPy is available, else (also if the cache cannot
+	be read or written) on the instance of proc_assignment."""
+	if instance_file and cache_dir:
+		try:
+			from vectorised import load_instance
+			shared = load_instance(instance_file, cache_dir)
+		except ImportError:
+			pass
+		except (EnvironmentError, InstanceError), e:
+			logger.warning("Not sharing the instance cache in %s: %s", cache_dir, e)
+		else:
+			shared.assignment = list(proc_assignment.assignment)
+			shared._build_state()
+			original = shared.__class__(instance=shared.instance)
+			original.assignment = list(original_assignment.assignment)
+			original._build_state()
+			return shared, original
+	return proc_assignment.clone(), original_assignment
+
+def _ignore_signals():
+	"""Pool initializer: Ctrl-C and SIGTERM, which often go to the whole
+	process group, are handled by the parent only. It closes the pool, and
+	the workers exit once they have handed back the child they are making."""
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+	signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+def _offspring(parent, other, kind, seed, sweeps):
+	"""Worker: crossover, repair and polish of one child on the shared
+	instance. Returns (cost, child as array('i'), moves evaluated), cost
+	and child are None if the repair failed."""
+	proc_assignment, original_assignment = _shared
+	rng = random.Random(seed)
+	proc_assignment.assignment = crossover(proc_assignment, parent, other, kind, rng)
+	proc_assignment._build_state()
+	if not repair(proc_assignment, original_assignment, rng):
+		return None, None, 0
+	cost, assignment, evaluations = polish(proc_assignment, original_assignment, sweeps, rng)
+	return cost, array('i', assignment), evaluations
+
+def _offspring_star(args):
+	return _offspring(*args)
+
+def _collect(results, count):
+	"""The count results of an imap_unordered, waited for with a timeout:
+	an untimed wait is not interrupted by signals in Python 2, so Ctrl-C
+	and SIGTERM would never reach the parent."""
+	for index in xrange(count):
+		while True:
+			try:
+				result = results.next(0.5)
+				break
+			except multiprocessing.TimeoutError:
+				pass
+		yield result
+
+def _seed_population(proc_assignment, original_assignment, size, sweeps, rng, budget):
+	"""The polished original assignment plus randomised greedy constructions,
+	fewer if the budget runs out first. Returns (population, moves evaluated)."""
+	from construction import construct
+	population = []
+	total_evaluations = 0
+	start = list(proc_assignment.assignment)
+	for member in xrange(size):
+		if member > 0 and budget.exhausted():
+			break
+		if member > 0:
+			construct(proc_assignment, rng)
+		else:
+			proc_assignment.assignment = list(start)
+			proc_assignment._build_state()
+		cost, assignment, evaluations = polish(proc_assignment, original_assignment, sweeps, rng)
+		population.append((cost, array('i', assignment)))
+		total_evaluations += evaluations
+	return population, total_evaluations
+
+def _replace(population, cost, child, min_distance):
+	"""Puts the child into the population in place of the closest member if
+	that one is within min_distance and worse, else in place of the worst
+	member if the child is better. population is a list of (cost, array)."""
+	closest = None
+	closest_distance = None
+	for index, (member_cost, member) in enumerate(population):
+		distance = hamming(child, member)
+		if closest_distance is None or distance < closest_distance:
+			closest = index
+			closest_distance = distance
+	if closest_distance < min_distance:
+		if cost < population[closest][0]:
+			population[closest] = (cost, child)
+		return
+	worst = max(xrange(len(population)), key=lambda index: population[index][0])
+	if cost < population[worst][0]:
+		population[worst] = (cost, child)
+
+def memetic(proc_assignment, original_assignment, population_size=10, crossover_kind=None, sweeps=1, min_distance=None, workers=None, budget=None, rng=random, report=None, instance_file=None, cache_dir=None):
+	"""Memetic search from proc_assignment (which must be feasible). Every
+	generation makes one child per worker with crossover_kind (a random one
+	of CROSSOVERS per child if None), repairs and polishes it with sweeps
+	sweeps of probe_neighbor. min_distance defaults to 2% of the processes.
+	workers=0 makes the children in this process, None uses one worker per
+	core. With the instance_file of proc_assignment and a cache_dir the
+	children are made on its memory-mapped binary cache (see
+	vectorised.load_instance). report(cost, proc_assignment) is called for
+	every new best. Stops and returns like probe_neighbor, with one budget
+	iteration per child."""
+	if population_size < 2:
+		raise InvalidArgumentException("The population needs at least two members")
+	if budget is None:
+		budget = SearchBudget()
+	if min_distance is None:
+		min_distance = max(proc_assignment.num_processes // 50, 1)
+	if workers is None:
+		workers = multiprocessing.cpu_count()
+	best = BestAssignment(proc_assignment, global_cost(proc_assignment, original_assignment), report)
+	evaluations = 0
+
+	_shared[:] = _shared_assignments(proc_assignment, original_assignment, instance_file, cache_dir)
+	pool = multiprocessing.Pool(workers, _ignore_signals) if workers else None
+	with best:
+		try:
+			population, evaluations = _seed_population(proc_assignment, original_assignment, population_size, sweeps, rng, budget)
+			for cost, member in population:
+				best.update(cost, member)
+			while not budget.exhausted():
+				jobs = []
+				for child in xrange(max(workers, 1)):
+					parent = min(rng.sample(population, 2))[1]
+					other = min(rng.sample(population, 2))[1]
+					kind = crossover_kind or rng.choice(CROSSOVERS)
+					jobs.append((parent, other, kind, rng.getrandbits(31), sweeps))
+				children = _collect(pool.imap_unordered(_offspring_star, jobs), len(jobs)) if pool else (_offspring(*job) for job in jobs)
+
+				improved = False
+				for cost, child, child_evaluations in children:
+					evaluations += child_evaluations
+					budget.iterations += 1
+					if child is not None:
+						improved = best.update(cost, child) or improved
+						_replace(population, cost, child, min_distance)
+				budget.end_sweep(improved)
+		finally:
+			if pool:
+				# not terminate(): a worker killed while it waits for a task
+				# can leave the task queue locked and the join hanging
+				pool.close()
+				pool.join()
+			del _shared[:]
+
+	proc_assignment.assignment = list(best.assignment)
+	proc_assignment._build_state()
+	return best.cost, best.assignment, evaluations
@@ -0,0 +1,117 @@
+# coding: utf-8
+
+# Progress and metrics instrumentation for the local search. A Metrics
+# object counts the moves evaluated and accepted, the rejected moves per
+# constraint (MCCon, SCCon, SSCon) and the time spent in the constraint
+# checks, the cost evaluation, the swaps, the kicks and in applying moves,
+# and records the best cost over time. Every interval seconds it writes
+# one JSON line with the totals (and the new minima since the previous
+# line) to a file or a TCP socket. The searches take metrics=None by
+# default and then count into a NullMetrics, which only calls the timed
+# functions and records nothing.
+
+from __future__ import print_function
+import sys
+import json
+import time
+import socket
+from ProcessAssignment import CONSTRAINTS, InvalidArgumentException
+
+TIMERS = ["constraints", "cost", "swaps", "kicks", "moves"]
+
+def open_sink(target):
+	"""Opens target for the metrics records: "-" is stdout, "host:port" a
+	TCP connection and anything else a file that the records are appended to."""
+	if target == "-":
+		return sys.stdout
+	host, separator, port = target.rpartition(":")
+	if separator and host and port.isdigit():
+		connection = socket.create_connection((host, int(port)))
+		return connection.makefile('w')
+	return open(target, 'a')
+
+class Metrics(object):
+	"""Counters of a running search, emitted as JSON lines to sink (any
+	object with write and flush) at most every interval seconds."""
+
+	def __init__(self, sink, interval=1.0):
+		if interval < 0:
+			raise InvalidArgumentException("The metrics interval cannot be negative")
+		self.sink = sink
+		self.interval = interval
+		self.start = time.time()
+		self.last_emit = self.start
+		self.evaluated = 0
+		self.accepted = 0
+		self.kick_moves = 0
+		self.rejected = [0] * (len(CONSTRAINTS) + 1) # by rejection code, 0 counts the allowed moves
+		self.timers = dict.fromkeys(TIMERS, 0.0)
+		self.best_cost = None
+		self.minima = [] # (elapsed, cost) since the last record
+
+	def timed(self, timer, function, *args):
+		"""Calls function(*args), adds its run time to timer and returns its result."""
+		start = time.time()
+		result = function(*args)
+		self.timers[timer] += time.time() - start
+		return result
+
+	def reject(self, rejections):
+		"""Counts the rejection codes of ProcessAssignment.move_rejections."""
+		for code in rejections:
+			self.rejected[code] += 1
+
+	def improved(self, cost):
+		"""Records a new best cost."""
+		self.best_cost = cost
+		self.minima.append((round(time.time() - self.start, 3), cost))
+
+	def tick(self):
+		"""Emits a record if the last one is at least interval seconds old."""
+		if time.time() - self.last_emit >= self.interval:
+			self.emit()
+
+	def record(self):
+		"""The current totals as a dict."""
+		rejected = dict(zip(CONSTRAINTS, self.rejected[1:]))
+		return {
+			"elapsed": round(time.time() - self.start, 3),
+			"evaluated": self.evaluated,
+			"accepted": self.accepted,
+			"kick_moves": self.kick_moves,
+			"rejected": rejected,
+			"seconds": dict((timer, round(seconds, 3)) for timer, seconds in self.timers.iteritems()),
+			"best_cost": self.best_cost,
+			"minima": self.minima,
+		}
+
+	def emit(self):
+		"""Writes the current totals as one JSON line."""
+		self.sink.write(json.dumps(self.record(), sort_keys=True) + "\n")
+		self.sink.flush()
+		self.minima = []
+		self.last_emit = time.time()
+
+class NullMetrics(object):
+	"""Stands in for Metrics when none are wanted: the timed functions are
+	called directly and nothing is recorded or emitted."""
+
+	def __init__(self):
+		self.evaluated = 0
+		self.accepted = 0
+		self.kick_moves = 0
+
+	def timed(self, timer, function, *args):
+		return function(*args)
+
+	def reject(self, rejections):
+		pass
+
+	def improved(self, cost):
+		pass
+
+	def tick(self):
+		pass
+
+	def emit(self):
+		pass
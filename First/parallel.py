@@ -0,0 +1,139 @@
+# coding: utf-8
+
+# Runs several independent local searches on one instance in parallel.
+# Every worker process loads its own copy of the instance, seeds its own
+# random.Random and reports each new minimum to the parent through a queue.
+# The parent keeps the overall best assignment and writes it to the output
+# file whenever it improves.
+
+from __future__ import print_function
+import time
+import random
+import signal
+import argparse
+import multiprocessing
+from Queue import Empty
+from ProcessAssignment import SearchBudget, CheckpointWriter, probe_neighbor, read_instance
+
+def _ignore_interrupt():
+	"""Pool initializer: Ctrl-C and SIGTERM are handled by the parent only."""
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+	signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+def _load(instance_file, initial_file, cache_dir):
+	"""Loads the instance and the initial assignment, memory-mapping the
+	binary instance cache when a cache_dir is given."""
+	proc_assignment = read_instance(instance_file, cache_dir)
+	proc_assignment.update_assignment(filename=initial_file)
+	return proc_assignment
+
+def _search(instance_file, initial_file, seed, queue, time_limit, max_iterations, stall_sweeps, cache_dir=None, construct=False):
+	"""Worker: one search with its own seed and its own ProcessAssignment,
+	started from a greedy assignment randomised by the seed if construct is set."""
+	assignment = _load(instance_file, initial_file, cache_dir)
+	original = assignment.clone()
+	if construct:
+		from construction import construct as construct_assignment
+		construct_assignment(assignment, random.Random(seed))
+
+	def report(cost, proc_assignment):
+		queue.put((seed, cost, list(proc_assignment.assignment)))
+
+	budget = SearchBudget(time_limit, max_iterations, stall_sweeps)
+	best_cost, best_assignment, evaluations = probe_neighbor(assignment, original, report=report, rng=random.Random(seed), budget=budget)
+	return seed, best_cost, best_assignment, evaluations
+
+# Set by the signal handler installed in __main__, polled by parallel_search
+_stop_requested = []
+
+def _request_stop(signum, frame):
+	"""SIGINT/SIGTERM handler: stop the workers and keep what they reported."""
+	_stop_requested.append(signum)
+
+def parallel_search(instance_file, initial_file, outfile=None, workers=None, seed=None, time_limit=None, max_iterations=None, stall_sweeps=None, cache_dir=None, construct=False):
+	"""Runs one search per worker (one per core by default) and keeps the
+	best assignment any of them reported. Every worker gets the given
+	budget, without one the search runs until interrupted. With a
+	cache_dir (needs NumPy) the workers memory-map one shared binary copy
+	of the instance instead of each parsing the text file. With construct
+	every worker starts from its own randomised greedy assignment (moving
+	costs still count against the initial one) instead. Returns
+	(best cost, best assignment, moves evaluated by the finished workers)."""
+	if workers is None:
+		workers = multiprocessing.cpu_count()
+	if cache_dir:
+		from vectorised import load_instance
+		load_instance(instance_file, cache_dir) # builds the cache once, before the workers race for it
+	seeds = random.Random(seed).sample(xrange(2**31), workers)
+
+	manager = multiprocessing.Manager()
+	queue = manager.Queue()
+	pool = multiprocessing.Pool(workers, _ignore_interrupt)
+	results = [pool.apply_async(_search, (instance_file, initial_file, worker_seed, queue, time_limit, max_iterations, stall_sweeps, cache_dir, construct)) for worker_seed in seeds]
+	pool.close()
+
+	best_cost = None
+	best_assignment = None
+	evaluations = 0
+	checkpoint = CheckpointWriter(outfile) if outfile else None
+
+	def consider(worker_seed, cost, assignment):
+		if best_cost is None or cost < best_cost:
+			print("New minima ", cost, "(seed %d)" % worker_seed)
+			if checkpoint:
+				checkpoint.submit(assignment)
+			return cost, assignment
+		return best_cost, best_assignment
+
+	try:
+		while not _stop_requested and not all(result.ready() for result in results):
+			try:
+				best_cost, best_assignment = consider(*queue.get(timeout=0.5))
+			except Empty:
+				pass
+	except KeyboardInterrupt:
+		_stop_requested.append(signal.SIGINT)
+
+	if _stop_requested:
+		pool.terminate()
+		pool.join()
+		# minima the workers reported before they were stopped
+		while True:
+			try:
+				best_cost, best_assignment = consider(*queue.get_nowait())
+			except Empty:
+				break
+	else:
+		for result in results:
+			worker_seed, cost, assignment, worker_evaluations = result.get()
+			evaluations += worker_evaluations
+			best_cost, best_assignment = consider(worker_seed, cost, assignment)
+		pool.join()
+	if checkpoint:
+		checkpoint.close()
+	return best_cost, best_assignment, evaluations
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Parallel restarts of the process assignment local search.")
+	parser.add_argument("instance_file")
+	parser.add_argument("initial_solution_file")
+	parser.add_argument("output_file")
+	parser.add_argument("workers", nargs="?", type=int, help="number of searches (default: one per core)")
+	parser.add_argument("--seed", type=int)
+	parser.add_argument("--time-limit", type=float, help="stop after this many seconds")
+	parser.add_argument("--max-iterations", type=int, help="stop each search after this many process steps")
+	parser.add_argument("--stall-sweeps", type=int, help="stop each search after this many sweeps without a new minimum")
+	parser.add_argument("--construct", action="store_true", help="start every search from a different randomised greedy assignment")
+	parser.add_argument("--cache-dir", help="share a memory-mapped binary copy of the instance kept in this directory (needs NumPy)")
+	args = parser.parse_args()
+
+	for signum in (signal.SIGINT, signal.SIGTERM):
+		signal.signal(signum, _request_stop)
+		signal.siginterrupt(signum, False)
+	start = time.time()
+	best_cost, best_assignment, evaluations = parallel_search(args.instance_file, args.initial_solution_file, args.output_file, args.workers, args.seed, args.time_limit, args.max_iterations, args.stall_sweeps, args.cache_dir, args.construct)
+	elapsed = time.time() - start
+
+	print("Final cost: %s" % best_cost)
+	print("Moves evaluated: %d" % evaluations)
+	print("Moves/sec: %.0f" % (evaluations / elapsed if elapsed > 0 else 0))
@@ -0,0 +1,181 @@
+# coding: utf-8
+
+# Penalty based search for the process assignment problem. Instead of
+# rejecting every move that breaks MCCon, SCCon or SSCon, the violations
+# are measured (capacity overflow over all machines and resources,
+# processes sharing a machine with their own service, locations missing
+# from the minimum spreads), kept up to date in O(R) per move, and added to
+# the cost with weights that adapt: a weight grows while its constraint is
+# violated and shrinks while it holds. The search (simulated annealing on
+# the penalised cost) may thus cross infeasible regions, but only feasible
+# assignments are ever reported as best.
+
+from __future__ import print_function
+import math
+import random
+from ProcessAssignment import BestAssignment, CostTracker, CostError, SearchBudget
+from annealing import CoolingSchedule, initial_temperature, make_schedule
+
+class ViolationTracker(object):
+	"""Running totals of the constraint violations of an assignment. delta()
+	must be asked before the move is made on the ProcessAssignment, move()
+	records it."""
+
+	def __init__(self, proc_assignment):
+		self.proc_assignment = proc_assignment
+		self.reset()
+
+	def reset(self):
+		"""Recomputes all totals from scratch."""
+		pa = self.proc_assignment
+		self.capacity = pa.capacity_overflow()
+		self.conflicts = pa.conflict_count()
+		self.shortfall = pa.spread_shortfall()
+
+	@property
+	def violations(self):
+		return (self.capacity, self.conflicts, self.shortfall)
+
+	def feasible(self):
+		return self.capacity == 0 and self.conflicts == 0 and self.shortfall == 0
+
+	def delta(self, process, machine):
+		"""(capacity, conflicts, shortfall) changes if process moves to machine, in O(R)."""
+		pa = self.proc_assignment
+		old_machine = pa.assignment[process]
+		if old_machine == machine:
+			return (0, 0, 0)
+
+		requirements = pa.process_requirements[process]
+		old_load = pa.machine_loads[old_machine]
+		new_load = pa.machine_loads[machine]
+		old_capacity = pa.machine_capacities[old_machine]
+		new_capacity = pa.machine_capacities[machine]
+		capacity = 0
+		for resource in xrange(pa.num_resources):
+			req = requirements[resource]
+			capacity += max(old_load[resource] - req - old_capacity[resource], 0) - max(old_load[resource] - old_capacity[resource], 0)
+			capacity += max(new_load[resource] + req - new_capacity[resource], 0) - max(new_load[resource] - new_capacity[resource], 0)
+
+		service = pa.process_services[process]
+		machines = pa.service_machines[service]
+		conflicts = 0
+		if machines[old_machine] > 1:
+			conflicts -= 1
+		if machines.get(machine, 0) > 0:
+			conflicts += 1
+
+		old_location = pa.machine_locations[old_machine]
+		new_location = pa.machine_locations[machine]
+		shortfall = 0
+		if old_location != new_location:
+			counts = pa.service_locations[service]
+			spread = pa.service_spreads[service] - int(counts[old_location] == 1) + int(counts[new_location] == 0)
+			min_spread = pa.service_min_spreads[service]
+			shortfall = max(min_spread - spread, 0) - max(min_spread - pa.service_spreads[service], 0)
+		return (capacity, conflicts, shortfall)
+
+	def move(self, process, machine, delta=None):
+		"""Records the move of process to machine, which must not have happened yet."""
+		if delta is None:
+			delta = self.delta(process, machine)
+		self.capacity += delta[0]
+		self.conflicts += delta[1]
+		self.shortfall += delta[2]
+
+	def check(self):
+		"""Compares the running totals with a full recomputation."""
+		pa = self.proc_assignment
+		expected = (pa.capacity_overflow(), pa.conflict_count(), pa.spread_shortfall())
+		if expected != self.violations:
+			raise CostError("Running violations %s differ from %s" % (self.violations, expected))
+
+class PenaltyWeights(object):
+	"""Adaptive multipliers of the three violation measures. After every
+	epoch a weight is multiplied by factor if its constraint was violated at
+	the end of the epoch and divided by it otherwise, never going below
+	minimum."""
+
+	def __init__(self, initial=1.0, factor=1.2, minimum=0.01):
+		self.weights = [initial, initial, initial]
+		self.factor = factor
+		self.minimum = minimum
+
+	def penalty(self, violations):
+		return sum(weight * violation for weight, violation in zip(self.weights, violations))
+
+	def update(self, violations):
+		for index, violation in enumerate(violations):
+			if violation > 0:
+				self.weights[index] *= self.factor
+			else:
+				self.weights[index] = max(self.weights[index] / self.factor, self.minimum)
+
+def penalty_search(proc_assignment, original_assignment, schedule="geometric", weights=None, budget=None, rng=random, report=None, stats=None, epoch_length=None, check_interval=0):
+	"""Simulated annealing on cost + weighted violations with random
+	relocations that are not checked against the constraints. weights is a
+	PenaltyWeights (adapted once per epoch), schedule a CoolingSchedule or
+	a schedule name of the annealing module. stats(record) receives the
+	iteration, elapsed time, temperature, cost, violations, weights and best
+	feasible cost after every epoch, report(cost, proc_assignment) every new
+	feasible best. Stops like probe_neighbor; the best cost and assignment
+	it returns are the feasible ones, so the start assignment must be
+	feasible."""
+	if budget is None:
+		budget = SearchBudget()
+	if weights is None:
+		weights = PenaltyWeights()
+	if epoch_length is None:
+		epoch_length = proc_assignment.num_processes
+	cost_tracker = CostTracker(proc_assignment, original_assignment, check_interval)
+	violations = ViolationTracker(proc_assignment)
+	if not isinstance(schedule, CoolingSchedule):
+		schedule = make_schedule(schedule, initial_temperature(cost_tracker, rng, swap_rate=0, check_constraints=False))
+
+	best = BestAssignment(proc_assignment, cost_tracker.total, report)
+	evaluations = 0
+	with best:
+		while not budget.exhausted():
+			temperature = schedule.temperature
+			accepted = 0
+			proposals = 0
+			improved = False
+			while proposals < epoch_length and not budget.exhausted():
+				process = rng.randrange(proc_assignment.num_processes)
+				machine = rng.randrange(proc_assignment.num_machines)
+				proposals += 1
+				evaluations += 1
+				budget.iterations += 1
+				if machine == proc_assignment.assignment[process]:
+					continue
+
+				violation_delta = violations.delta(process, machine)
+				delta = cost_tracker.delta(process, machine) + weights.penalty(violation_delta)
+				if delta > 0 and (temperature <= 0 or rng.random() >= math.exp(-delta / temperature)):
+					continue
+
+				violations.move(process, machine, violation_delta)
+				cost_tracker.move(process, machine)
+				accepted += 1
+				if check_interval and cost_tracker.moves % check_interval == 0:
+					violations.check()
+
+				if violations.feasible() and best.update(cost_tracker.total):
+					improved = True
+
+			budget.end_sweep(improved)
+			if stats:
+				stats({
+					"iteration": budget.iterations,
+					"elapsed": budget.elapsed(),
+					"temperature": temperature,
+					"acceptance_ratio": float(accepted) / proposals if proposals else 0.0,
+					"cost": cost_tracker.total,
+					"violations": list(violations.violations),
+					"weights": list(weights.weights),
+					"best_cost": best.cost,
+				})
+			weights.update(violations.violations)
+			schedule.update(float(accepted) / proposals if proposals else 0.0, improved)
+
+	return best.cost, best.assignment, evaluations
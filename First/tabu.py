@@ -0,0 +1,157 @@
+# coding: utf-8
+
+# Tabu search for the process assignment problem. Every iteration samples a
+# few processes, evaluates all their relocations with evaluate_moves and
+# their swaps with the processes on the most promising machines, and makes
+# the best admissible move, even if it is uphill. A move is not admissible
+# when it is tabu (a process would return to a machine it left less than
+# tenure iterations ago) or when it leads back to an assignment in the
+# recent history, unless it beats the best cost found so far (aspiration).
+# Both checks are O(1): the tabu memory is a dict keyed on (process,
+# machine), and assignments are remembered by their Zobrist hash only.
+
+from __future__ import print_function
+import random
+from collections import deque
+from ProcessAssignment import BestAssignment, CostTracker, SearchBudget, swap_candidates, try_swap
+
+class TabuList(object):
+	"""Tenure based tabu memory on (process, machine) attributes."""
+
+	def __init__(self, tenure):
+		self.tenure = tenure
+		self.expiry = {}
+
+	def add(self, process, machine, iteration):
+		"""Forbids moving process to machine until iteration + tenure."""
+		self.expiry[(process, machine)] = iteration + self.tenure
+		if len(self.expiry) > 4 * self.tenure + 64:
+			# drop expired entries now and then so the dict stays small
+			self.expiry = dict((key, until) for key, until in self.expiry.iteritems() if until > iteration)
+
+	def is_tabu(self, process, machine, iteration):
+		return self.expiry.get((process, machine), -1) > iteration
+
+class ZobristHash(object):
+	"""Incremental hash of an assignment: the XOR of one random 64-bit key
+	per (process, machine) pair in the assignment, updated in O(1) per move."""
+
+	def __init__(self, proc_assignment, rng=random):
+		self.keys = [[rng.getrandbits(64) for machine in xrange(proc_assignment.num_machines)] for process in xrange(proc_assignment.num_processes)]
+		self.value = 0
+		for process in xrange(proc_assignment.num_processes):
+			self.value ^= self.keys[process][proc_assignment.assignment[process]]
+
+	def after_move(self, process, old_machine, new_machine):
+		"""Hash of the assignment after moving process, without moving it."""
+		keys = self.keys[process]
+		return self.value ^ keys[old_machine] ^ keys[new_machine]
+
+	def after_swap(self, process, machine, partner, partner_machine):
+		"""Hash of the assignment after process and partner exchange machines."""
+		keys = self.keys[process]
+		partner_keys = self.keys[partner]
+		return self.value ^ keys[machine] ^ keys[partner_machine] ^ partner_keys[partner_machine] ^ partner_keys[machine]
+
+	def move(self, process, old_machine, new_machine):
+		self.value = self.after_move(process, old_machine, new_machine)
+
+	def swap(self, process, machine, partner, partner_machine):
+		self.value = self.after_swap(process, machine, partner, partner_machine)
+
+class History(object):
+	"""The hashes of the last size visited assignments."""
+
+	def __init__(self, size):
+		self.order = deque()
+		self.seen = {}
+		self.size = size
+
+	def add(self, value):
+		self.order.append(value)
+		self.seen[value] = self.seen.get(value, 0) + 1
+		if len(self.order) > self.size:
+			old = self.order.popleft()
+			if self.seen[old] == 1:
+				del self.seen[old]
+			else:
+				self.seen[old] -= 1
+
+	def __contains__(self, value):
+		return value in self.seen
+
+def tabu_search(proc_assignment, original_assignment, tenure=20, sample_size=10, swap_machines=3, history_size=100000, budget=None, rng=random, report=None, check_interval=0):
+	"""Tabu search from the current assignment, see the module comment.
+	Each iteration evaluates sample_size random processes, swaps are tried
+	with the processes on their swap_machines best machines (0 disables
+	swaps). Stops and returns like probe_neighbor, but the stall limit of
+	the budget counts iterations here. report(cost, proc_assignment) is
+	called for every new best."""
+	if budget is None:
+		budget = SearchBudget()
+	cost_tracker = CostTracker(proc_assignment, original_assignment, check_interval)
+	tabu = TabuList(tenure)
+	zobrist = ZobristHash(proc_assignment, rng)
+	history = History(history_size)
+	history.add(zobrist.value)
+
+	best = BestAssignment(proc_assignment, cost_tracker.total, report)
+	evaluations = 0
+	with best:
+		while not budget.exhausted():
+			iteration = budget.iterations
+			best_move = None
+			best_delta = None
+
+			def admissible(delta, tabu_moves, new_hash):
+				if best_delta is not None and delta >= best_delta:
+					return False
+				if cost_tracker.total + delta < best.cost: # aspiration
+					return True
+				for process, machine in tabu_moves:
+					if tabu.is_tabu(process, machine, iteration):
+						return False
+				return new_hash not in history
+
+			for process in rng.sample(xrange(proc_assignment.num_processes), min(sample_size, proc_assignment.num_processes)):
+				current = proc_assignment.assignment[process]
+				feasible, deltas = proc_assignment.evaluate_moves(process, original_assignment)
+				evaluations += proc_assignment.num_machines
+				for machine in xrange(proc_assignment.num_machines):
+					if feasible[machine] and admissible(deltas[machine], [(process, machine)], zobrist.after_move(process, current, machine)):
+						best_move = (process, machine, None)
+						best_delta = deltas[machine]
+
+				if not swap_machines:
+					continue
+				candidates = swap_candidates(proc_assignment, process, deltas, swap_machines)
+				evaluations += len(candidates)
+				for partner in candidates:
+					if not try_swap(proc_assignment, process, partner):
+						continue
+					partner_machine = proc_assignment.assignment[partner]
+					delta = cost_tracker.swap_delta(process, partner)
+					if admissible(delta, [(process, partner_machine), (partner, current)], zobrist.after_swap(process, current, partner, partner_machine)):
+						best_move = (process, partner_machine, partner)
+						best_delta = delta
+
+			budget.iterations += 1
+			if best_move is None:
+				budget.end_sweep(False)
+				continue
+
+			process, machine, partner = best_move
+			current = proc_assignment.assignment[process]
+			if partner is None:
+				cost_tracker.move(process, machine)
+				zobrist.move(process, current, machine)
+			else:
+				cost_tracker.swap(process, partner)
+				zobrist.swap(process, current, partner, machine)
+				tabu.add(partner, machine, iteration)
+			history.add(zobrist.value)
+			tabu.add(process, current, iteration) # do not send it straight back
+
+			budget.end_sweep(best.update(cost_tracker.total))
+
+	return best.cost, best.assignment, evaluations
@@ -0,0 +1,82 @@
+# coding: utf-8
+
+# Property check of the incremental cost deltas on the shipped instances:
+# random moves and swaps, ignoring the constraints, whose local_cost_delta,
+# CostTracker.delta, evaluate_moves and CostTracker.swap_delta must all
+# equal the change of global_cost. Exits with status 1 on a mismatch.
+#
+#   python test_deltas.py [--moves 200] [--seed 0] [--cache-dir DIR]
+
+from __future__ import print_function
+import os
+import sys
+import random
+import argparse
+from ProcessAssignment import CostTracker, CostError, global_cost, local_cost_delta, read_instance
+from batch import discover
+
+def verify_deltas(proc_assignment, original_assignment, moves=1000, rng=random):
+	"""Makes moves random moves (a tenth of them back to the original
+	machine and a tenth to the current one), each followed by a random swap,
+	and compares every delta with the change of global_cost. Raises a
+	CostError on the first mismatch and restores the assignment otherwise."""
+	start = list(proc_assignment.assignment)
+	cost_tracker = CostTracker(proc_assignment, original_assignment)
+	cost = global_cost(proc_assignment, original_assignment)
+	for step in xrange(moves):
+		process = rng.randrange(proc_assignment.num_processes)
+		kind = rng.random()
+		if kind < 0.1:
+			machine = original_assignment.assignment[process]
+		elif kind < 0.2:
+			machine = proc_assignment.assignment[process]
+		else:
+			machine = rng.randrange(proc_assignment.num_machines)
+
+		expected = [local_cost_delta(proc_assignment, process, machine, original_assignment), cost_tracker.delta(process, machine)]
+		if machine != proc_assignment.assignment[process]:
+			expected.append(proc_assignment.evaluate_moves(process, original_assignment)[1][machine])
+		cost_tracker.move(process, machine)
+		new_cost = global_cost(proc_assignment, original_assignment)
+		if any(delta != new_cost - cost for delta in expected):
+			raise CostError("Deltas %s of moving process %d to machine %d differ from the global_cost change %d" % (expected, process, machine, new_cost - cost))
+		cost = new_cost
+
+		partner = rng.randrange(proc_assignment.num_processes)
+		delta = cost_tracker.swap_delta(process, partner)
+		cost_tracker.swap(process, partner)
+		new_cost = global_cost(proc_assignment, original_assignment)
+		if delta != new_cost - cost:
+			raise CostError("Delta %d of swapping processes %d and %d differs from the global_cost change %d" % (delta, process, partner, new_cost - cost))
+		cost = new_cost
+	for process in xrange(proc_assignment.num_processes):
+		proc_assignment.move(process, start[process])
+
+def check_directory(directory, moves, seed, cache_dir=None):
+	"""Runs verify_deltas on every instance of directory, returns the
+	number of instances that failed."""
+	failures = 0
+	for k in discover(directory):
+		instance_file = os.path.join(directory, "instance_%d.txt" % k)
+		assignment = read_instance(instance_file, cache_dir)
+		assignment.update_assignment(filename=os.path.join(directory, "initial_%d.txt" % k))
+		original = assignment.clone()
+		try:
+			verify_deltas(assignment, original, moves, random.Random(seed))
+			print("ok   %s" % instance_file)
+		except CostError, e:
+			print("FAIL %s: %s" % (instance_file, e))
+			failures += 1
+	return failures
+
+if __name__ == "__main__":
+	here = os.path.dirname(os.path.abspath(__file__))
+	parser = argparse.ArgumentParser(description="Check the incremental cost deltas against global_cost.")
+	parser.add_argument("directories", nargs="*", default=[os.path.join(here, "dms_assignment1_small"), os.path.join(here, "dms_assignment1_large")])
+	parser.add_argument("--moves", type=int, default=200, help="random moves (each followed by a swap) per instance")
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--cache-dir", help="check the NumPy backend, see ProcessAssignment.read_instance")
+	args = parser.parse_args()
+
+	failures = sum(check_directory(directory, args.moves, args.seed, args.cache_dir) for directory in args.directories)
+	sys.exit(1 if failures else 0)
@@ -0,0 +1,256 @@
+# coding: utf-8
+
+# NumPy backed variant of ProcessAssignment. The instance data is kept in
+# (M x R) and (P x R) matrices and int32 vectors so that the whole
+# assignment can be evaluated with a handful of batched reductions instead
+# of interpreted loops over tuples. The module functions of
+# ProcessAssignment (try_constraints, global_cost, CostTracker, ...) work
+# unchanged on these objects.
+
+from __future__ import print_function
+import os
+import struct
+import hashlib
+import numpy as np
+from ProcessAssignment import Instance, ProcessAssignment, InstanceError, atomic_write
+
+# Binary instance cache: a header (magic, version, SHA-1 of the source
+# file, num_resources, num_machines, num_services, num_processes,
+# num_locations) followed by contiguous little-endian int32 arrays in the
+# order of CACHE_ARRAYS.
+CACHE_MAGIC = b"PAI1"
+CACHE_VERSION = 1
+CACHE_HEADER = struct.Struct("<4sI20s5i")
+CACHE_ARRAYS = ["machine_capacities", "soft_machine_capacities", "machine_locations", "service_min_spreads", "process_services", "process_requirements", "process_moving_costs"]
+
+class ArrayInstance(Instance):
+	"""Instance with the data in read-only NumPy arrays: (M x R) and (P x R)
+	matrices and int32 vectors."""
+	__slots__ = ()
+
+	def __init__(self, filename=None, **fields):
+		Instance.__init__(self, filename, **fields)
+		if filename:
+			self._build_arrays()
+		for name in CACHE_ARRAYS:
+			getattr(self, name).flags.writeable = False
+
+	def _build_arrays(self):
+		"""Converts the tuple based instance data into arrays."""
+		shape = (self.num_machines, self.num_resources)
+		self.machine_capacities = np.array(self.machine_capacities, dtype=np.int32).reshape(shape)
+		self.soft_machine_capacities = np.array(self.soft_machine_capacities, dtype=np.int32).reshape(shape)
+		self.process_requirements = np.array(self.process_requirements, dtype=np.int32).reshape((self.num_processes, self.num_resources))
+
+		self.machine_locations = np.array(self.machine_locations, dtype=np.int32)
+		self.service_min_spreads = np.array(self.service_min_spreads, dtype=np.int32)
+		self.process_services = np.array(self.process_services, dtype=np.int32)
+		self.process_moving_costs = np.array(self.process_moving_costs, dtype=np.int32)
+
+class ArrayProcessAssignment(ProcessAssignment):
+	"""Stores an assignment of an ArrayInstance in NumPy arrays."""
+	__slots__ = ()
+	instance_class = ArrayInstance
+
+	def _build_state(self):
+		"""Rebuilds the incremental state with batched scatter-adds."""
+		self.assignment = np.array(self.assignment, dtype=np.int32)
+
+		self.machine_loads = np.zeros((self.num_machines, self.num_resources), dtype=np.int64)
+		np.add.at(self.machine_loads, self.assignment, self.process_requirements)
+
+		self.service_locations = np.zeros((self.num_services, self.num_locations), dtype=np.int32)
+		np.add.at(self.service_locations, (self.process_services, self.machine_locations[self.assignment]), 1)
+		self.service_spreads = np.count_nonzero(self.service_locations, axis=1).tolist()
+
+		self.machine_processes = [set() for machine in xrange(self.num_machines)]
+		self.service_machines = [{} for service in xrange(self.num_services)]
+		for process, machine in enumerate(self.assignment.tolist()):
+			self.machine_processes[machine].add(process)
+			machines = self.service_machines[self.process_services[process]]
+			machines[machine] = machines.get(machine, 0) + 1
+
+	def _add_process(self, process, machine):
+		"""Accounts for process running on machine in the incremental state."""
+		self.machine_loads[machine] += self.process_requirements[process]
+		self.machine_processes[machine].add(process)
+
+		service = self.process_services[process]
+		machines = self.service_machines[service]
+		machines[machine] = machines.get(machine, 0) + 1
+		location = self.machine_locations[machine]
+		if self.service_locations[service, location] == 0:
+			self.service_spreads[service] += 1
+		self.service_locations[service, location] += 1
+
+	def _remove_process(self, process, machine):
+		"""Removes process running on machine from the incremental state."""
+		self.machine_loads[machine] -= self.process_requirements[process]
+		self.machine_processes[machine].discard(process)
+
+		service = self.process_services[process]
+		machines = self.service_machines[service]
+		if machines[machine] == 1:
+			del machines[machine]
+		else:
+			machines[machine] -= 1
+		location = self.machine_locations[machine]
+		self.service_locations[service, location] -= 1
+		if self.service_locations[service, location] == 0:
+			self.service_spreads[service] -= 1
+
+	def moving_cost(self, original_assignment):
+		"""Sum of the moving costs of all processes that left their original machine."""
+		moved = self.assignment != np.asarray(original_assignment.assignment)
+		return int(self.process_moving_costs[moved].sum())
+
+	def machine_load_cost(self, machine):
+		"""Sum of the loads above the soft capacities of one machine."""
+		return int(np.maximum(self.machine_loads[machine] - self.soft_machine_capacities[machine], 0).sum())
+
+	def load_cost(self):
+		"""Sum of the loads above the soft capacities over all machines and resources (MLCost)."""
+		return int(np.maximum(self.machine_loads - self.soft_machine_capacities, 0).sum())
+
+	def capacity_overflow(self):
+		"""Sum of the loads above the hard capacities over all machines and
+		resources, zero iff MCCon holds for the whole assignment."""
+		return int(np.maximum(self.machine_loads - self.machine_capacities, 0).sum())
+
+	def evaluate_moves(self, process, original_assignment=None):
+		"""Vectorised over machines: returns the boolean feasibility mask and
+		the int64 cost delta vector for moving process to every machine, see
+		ProcessAssignment.evaluate_moves."""
+		feasible = self.move_rejections(process) == 0
+		feasible[self.assignment[process]] = False
+		return feasible, self.move_deltas(process, original_assignment)
+
+	def move_rejections(self, process):
+		"""Vectorised rejection codes, see ProcessAssignment.move_rejections."""
+		current = self.assignment[process]
+		service = self.process_services[process]
+
+		# MCCon
+		mccon = ((self.machine_loads + self.process_requirements[process]) > self.machine_capacities).any(axis=1)
+
+		# SCCon
+		sccon = np.zeros(self.num_machines, dtype=bool)
+		sccon[list(self.service_machines[service])] = True
+
+		# SSCon
+		location_counts = self.service_locations[service].copy()
+		location_counts[self.machine_locations[current]] -= 1
+		spread = self.service_spreads[service] - int(location_counts[self.machine_locations[current]] == 0) + (location_counts[self.machine_locations] == 0)
+		sscon = spread < self.service_min_spreads[service]
+
+		rejections = np.select([mccon, sccon, sscon], [1, 2, 3], 0)
+		rejections[current] = 0
+		return rejections
+
+	def move_deltas(self, process, original_assignment=None):
+		"""Vectorised cost deltas, see ProcessAssignment.move_deltas."""
+		current = self.assignment[process]
+		requirements = self.process_requirements[process]
+		loads = self.machine_loads
+		soft = self.soft_machine_capacities
+
+		current_load = loads[current]
+		leave_delta = (np.maximum(current_load - requirements - soft[current], 0) - np.maximum(current_load - soft[current], 0)).sum()
+		delta = (np.maximum(loads + requirements - soft, 0) - np.maximum(loads - soft, 0)).sum(axis=1) + leave_delta
+
+		if original_assignment is not None:
+			original_machine = original_assignment.assignment[process]
+			moving_cost = int(self.process_moving_costs[process])
+			paid = moving_cost if current != original_machine else 0
+			delta += moving_cost - paid
+			delta[original_machine] -= moving_cost
+
+		delta[current] = 0
+		return delta
+
+def _file_digest(filename):
+	"""SHA-1 of the contents of filename."""
+	digest = hashlib.sha1()
+	with open(filename, "rb") as f:
+		for chunk in iter(lambda: f.read(1 << 16), b""):
+			digest.update(chunk)
+	return digest.digest()
+
+def save_binary(proc_assignment, filename, digest):
+	"""Writes the instance part of an ArrayProcessAssignment to filename in
+	the binary cache format with atomic_write, so that concurrent readers
+	never see a partial cache."""
+	pa = proc_assignment
+	header = CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, digest, pa.num_resources, pa.num_machines, pa.num_services, pa.num_processes, pa.num_locations)
+
+	def write(f):
+		f.write(header)
+		for name in CACHE_ARRAYS:
+			f.write(np.ascontiguousarray(getattr(pa, name), dtype="<i4").tobytes())
+	atomic_write(filename, write, ".instance")
+
+def load_binary(filename, digest=None):
+	"""Memory-maps a binary cache file and returns an ArrayProcessAssignment
+	whose ArrayInstance arrays are read-only views into the mapping, without
+	any copying. Processes loading the same file share its pages. Raises an
+	InstanceError if the file is not a cache or, given digest, belongs to a
+	different source file."""
+	with open(filename, "rb") as f:
+		header = f.read(CACHE_HEADER.size)
+	if len(header) != CACHE_HEADER.size:
+		raise InstanceError("Truncated instance cache: %s" % filename)
+	magic, version, file_digest, resources, machines, services, processes, locations = CACHE_HEADER.unpack(header)
+	if magic != CACHE_MAGIC or version != CACHE_VERSION:
+		raise InstanceError("Not an instance cache: %s" % filename)
+	if digest is not None and file_digest != digest:
+		raise InstanceError("Instance cache %s is stale" % filename)
+
+	shapes = {
+		"machine_capacities": (machines, resources),
+		"soft_machine_capacities": (machines, resources),
+		"machine_locations": (machines,),
+		"service_min_spreads": (services,),
+		"process_services": (processes,),
+		"process_requirements": (processes, resources),
+		"process_moving_costs": (processes,),
+	}
+	# a plain ndarray view of the mapping: same pages, but without the
+	# per-item overhead of memmap.__getitem__ in the search loops
+	data = np.memmap(filename, dtype="<i4", mode="r", offset=CACHE_HEADER.size).view(np.ndarray)
+	if data.size != sum(int(np.prod(shapes[name])) for name in CACHE_ARRAYS):
+		raise InstanceError("Truncated instance cache: %s" % filename)
+
+	fields = {}
+	offset = 0
+	for name in CACHE_ARRAYS:
+		size = int(np.prod(shapes[name]))
+		fields[name] = data[offset:offset+size].reshape(shapes[name])
+		offset += size
+	instance = ArrayInstance(num_resources=resources, num_machines=machines, num_services=services, num_processes=processes, num_locations=locations, **fields)
+	return ArrayProcessAssignment(instance=instance)
+
+def cache_path(instance_file, cache_dir=None, digest=None):
+	"""Cache file of instance_file: <cache_dir>/<sha1 of the source>.bin,
+	cache_dir defaults to .cache next to the instance file."""
+	if cache_dir is None:
+		cache_dir = os.path.join(os.path.dirname(os.path.abspath(instance_file)), ".cache")
+	if digest is None:
+		digest = _file_digest(instance_file)
+	return os.path.join(cache_dir, digest.encode("hex") + ".bin")
+
+def load_instance(instance_file, cache_dir=None):
+	"""Returns an ArrayProcessAssignment for instance_file. The binary cache
+	is memory-mapped when it exists; otherwise the text file is parsed once
+	and the cache is written for the next load."""
+	digest = _file_digest(instance_file)
+	path = cache_path(instance_file, cache_dir, digest)
+	if not os.path.exists(path):
+		directory = os.path.dirname(path)
+		if not os.path.isdir(directory):
+			try:
+				os.makedirs(directory)
+			except OSError:
+				if not os.path.isdir(directory): # another worker may have just created it
+					raise
+		save_binary(ArrayProcessAssignment(filename=instance_file), path, digest)
+	return load_binary(path, digest)